@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, status, Response
 from app.core.deps import get_current_user
-from app.schemas.file_purchase import PurchaseFileRequest, TransactionResponse, BoughtFilesResponse
+from app.schemas.file_purchase import (
+    PurchaseFileRequest, CartPurchaseRequest, CartPurchaseResponse, TransactionResponse, BoughtFilesResponse,
+)
 from app.services.file_purchase import FilePurchaseService
 from app.models.account import User
 
@@ -13,7 +15,7 @@ async def purchase_file(
 ):
     """
     Купівля файлу за поінти.
-    Повертає 204, або 402 якщо недостатньо поінтів.
+    Повертає 204, 402 якщо недостатньо поінтів, або 409 якщо файл уже куплено.
     """
     await FilePurchaseService.purchase_file(
         user_id=str(current_user.id),
@@ -21,6 +23,17 @@ async def purchase_file(
     )
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
+@router.post("/cart", response_model=CartPurchaseResponse)
+async def purchase_cart(
+    req: CartPurchaseRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Купівля кількох файлів одним списанням. Уже куплені файли пропускаються
+    (поле skipped); 402 якщо поінтів не вистачає на весь кошик.
+    """
+    return await FilePurchaseService.purchase_cart(str(current_user.id), req.file_ids)
+
 @router.get("/transactions/user", response_model=list[TransactionResponse])
 async def user_transactions(
     current_user: User = Depends(get_current_user),
@@ -1,9 +1,17 @@
 import json
-from typing import Optional, List
-from fastapi import APIRouter, Depends, Query, UploadFile, File as FUpload, Form, HTTPException, status
-from app.core.deps import get_current_user_optional
-from app.schemas.files import FileUploadRequest, FileResponse
+from typing import Optional, List, Literal
+from fastapi import APIRouter, Depends, Header, Query, Request, Response, UploadFile, File as FUpload, Form, HTTPException, status
+from app.core.admission import admission
+from app.core.deps import get_current_admin, get_current_user, get_current_user_optional, get_loaders
+from app.core.loaders import Loaders
+from app.core.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT
+from app.schemas.files import (
+    FileUploadRequest, FileResponse, NearDuplicateResponse, UploadCreateRequest, UploadSessionResponse,
+)
 from app.services.files import FileService
+from app.services.near_duplicates import NearDuplicateService
+from app.services.thumbs import ThumbService
+from app.services.uploads import UploadService
 
 router = APIRouter(tags=["files"])
 
@@ -13,6 +21,11 @@ async def upload_file(
     raw_file: UploadFile = FUpload(...),
     current_user=Depends(get_current_user_optional),
 ):
+    """
+    Завантаження одним multipart-запитом. Admission control (503 + Retry-After)
+    спрацьовує вже після прийому тіла; щоб не передавати великий файл даремно,
+    клієнтам варто використовувати /uploads — там перевірка йде до першого байта.
+    """
     if not current_user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
     try:
@@ -24,19 +37,144 @@ async def upload_file(
         )
     return await FileService.upload(str(current_user.id), meta_obj, raw_file)
 
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=201)
+async def create_upload(
+    body: UploadCreateRequest,
+    response: Response,
+    current_user=Depends(get_current_user),
+):
+    """
+    Відкриває chunked-завантаження. Далі: PATCH /uploads/{id} з Upload-Offset,
+    HEAD /uploads/{id} щоб дізнатися офсет після обриву. Після останнього байта
+    файл реєструється автоматично, і PATCH повертає file_id; повторний PATCH,
+    HEAD (Upload-File-Id) і GET /uploads/{id} повертають його ж.
+    """
+    session = await UploadService.create(str(current_user.id), body)
+    response.headers["Location"] = f"/api/files/uploads/{session.id}"
+    response.headers["Upload-Offset"] = "0"
+    return UploadService.to_response(session)
+
+@router.head("/uploads/{upload_id}")
+async def upload_offset(upload_id: str, current_user=Depends(get_current_user)):
+    session = await UploadService.get(upload_id, str(current_user.id))
+    headers = {
+        "Upload-Offset": str(session.offset),
+        "Upload-Length": str(session.size),
+        "Cache-Control": "no-store",
+    }
+    if session.file_id:
+        headers["Upload-File-Id"] = str(session.file_id)
+    return Response(headers=headers)
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_status(upload_id: str, current_user=Depends(get_current_user)):
+    """Стан сесії; після фіналізації містить file_id (зокрема, якщо відповідь PATCH загубилась)."""
+    session = await UploadService.get(upload_id, str(current_user.id))
+    return UploadService.to_response(session)
+
+@router.patch("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., ge=0),
+    content_type: str = Header(""),
+    current_user=Depends(get_current_user),
+):
+    if content_type != "application/offset+octet-stream":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Content-Type must be application/offset+octet-stream"
+        )
+    session = await UploadService.get(upload_id, str(current_user.id))
+    session = await UploadService.append(session, upload_offset, request.stream())
+    response.headers["Upload-Offset"] = str(session.offset)
+    return UploadService.to_response(session)
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def abort_upload(upload_id: str, current_user=Depends(get_current_user)):
+    session = await UploadService.get(upload_id, str(current_user.id))
+    await UploadService.abort(session)
+    return Response(status_code=204)
+
 @router.get("/", response_model=list[FileResponse])
 async def list_files(
+    response: Response,
     tags: Optional[List[str]] = Query(None, alias="tag"),
     file_types: Optional[List[str]] = Query(None, alias="file_type"),
-    current_user=Depends(get_current_user_optional)
+    sort: Literal["upload_date", "purchase_count", "price"] = "upload_date",
+    order: Literal["asc", "desc"] = "desc",
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = None,
+    accept: str = Header(""),
+    current_user=Depends(get_current_user_optional),
+    loaders: Loaders = Depends(get_loaders),
 ):
+    """
+    Сторінка каталогу. Курсор наступної сторінки віддається у заголовку
+    `X-Next-Cursor` (відсутній на останній сторінці), тіло лишається списком.
+    thumbnail_srcset містить один формат: AVIF/WebP, якщо вони є в Accept, інакше JPEG.
+    """
     user_id = str(current_user.id) if current_user else None
-    return await FileService.list_files(user_id=user_id, filters=tags, file_types=file_types)
+    items, next_cursor = await FileService.list_files(
+        user_id=user_id, filters=tags, file_types=file_types, loaders=loaders,
+        sort=sort, order=order, limit=limit, cursor=cursor, accept=accept,
+    )
+    response.headers["Vary"] = "Accept"
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+@router.get("/admin/preview-queue")
+async def preview_queue_stats(admin=Depends(get_current_admin)):
+    """Стан черги генерації варіантів по видах: глибина, вартість, очікування, відмови."""
+    return await admission.stats()
+
+@router.get("/admin/near-duplicates/{file_id}", response_model=list[NearDuplicateResponse])
+async def near_duplicates(
+    file_id: str,
+    k: Optional[int] = Query(None, ge=0, le=12),
+    admin=Depends(get_current_admin),
+):
+    """Зображення, схожі на file_id (відстань Хеммінга dHash <= k)."""
+    doc = await FileService.get_file_doc(file_id)
+    if not doc.phash:
+        return []
+    return [
+        NearDuplicateResponse(file_id=str(fid), distance=d)
+        for fid, d in NearDuplicateService.find(doc.phash, k, exclude=doc.id)
+    ]
 
 @router.get("/{file_id}", response_model=FileResponse)
 async def get_file(
     file_id: str,
-    current_user=Depends(get_current_user_optional)
+    response: Response,
+    accept: str = Header(""),
+    current_user=Depends(get_current_user_optional),
+    loaders: Loaders = Depends(get_loaders),
 ):
     user_id = str(current_user.id) if current_user else None
-    return await FileService.get_file_detail(user_id=user_id, file_id=file_id)
+    response.headers["Vary"] = "Accept"
+    return await FileService.get_file_detail(user_id=user_id, file_id=file_id, loaders=loaders, accept=accept)
+
+@router.get("/{file_id}/thumb")
+async def get_thumb(
+    file_id: str,
+    w: int = Query(256, ge=1, le=4096),
+    h: Optional[int] = Query(None, ge=1, le=4096),
+    fmt: str = "auto",
+    accept: str = Header(""),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Thumbnail під довільний layout. w/h нормалізуються до бакетів, fmt=auto
+    обирає AVIF/WebP/JPEG за заголовком Accept.
+    """
+    w, h, norm_fmt = ThumbService.normalize(w, h, fmt, accept)
+    data, etag, content_type = await ThumbService.get_thumb(file_id, w, h, norm_fmt)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if fmt == "auto":
+        headers["Vary"] = "Accept"
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=data, media_type=content_type, headers=headers)
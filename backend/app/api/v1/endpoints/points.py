@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, status
 from app.core.deps import get_current_user
-from app.schemas.points import PurchaseRequest, BalanceResponse, TransactionPublic
+from app.schemas.points import PurchaseRequest, BalanceResponse, CommissionSummaryResponse, TransactionPublic
 from app.services.points import PointsService
 from app.models.account import User
 
@@ -29,3 +29,10 @@ async def transactions(
 ):
     user_id = str(current_user.id)
     return await PointsService.list_transactions(user_id)
+
+@router.get("/commission", response_model=CommissionSummaryResponse)
+async def commission(
+    current_user: User = Depends(get_current_user),
+):
+    """Авторська комісія: pending — продажі, ще не зараховані фоновим flusher-ом."""
+    return await PointsService.commission_summary(str(current_user.id))
@@ -0,0 +1,166 @@
+import math
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, status
+from app.models.preview_jobs import PreviewJob
+from .config import settings
+
+# Оцінка вартості генерації варіантів у секундах роботи воркера:
+# вид -> (база, секунд на MB оригіналу, стеля)
+COST_MODEL = {
+    "image": (0.3, 0.05, 8.0),
+    "pdf":   (0.5, 0.5, 3.0),   # рендеряться лише до 5 сторінок: ~1 сторінка на 200 KB, далі стеля
+    "audio": (0.3, 0.02, 30.0),  # огинаюча читає весь трек
+    "video": (5.0, 0.01, 60.0),
+}
+# вікно, за яким рахуються середні очікування і час обробки
+STATS_WINDOW = timedelta(minutes=15)
+
+
+def media_kind(file_type: str) -> Optional[str]:
+    """Вид для обліку черги; None — файл не декодується і нічого не коштує."""
+    if file_type == "application/pdf":
+        return "pdf"
+    kind = file_type.split("/", 1)[0] if file_type else ""
+    return kind if kind in COST_MODEL else None
+
+
+def estimate_cost(file_type: str, size: int) -> float:
+    kind = media_kind(file_type)
+    if kind is None:
+        return 0.0
+    base, per_mb, cap = COST_MODEL[kind]
+    return min(base + per_mb * size / (1024 * 1024), cap)
+
+
+class Overloaded(HTTPException):
+    def __init__(self, kind: str, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Too many {kind} files are being processed, retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class AdmissionController:
+    """
+    Обмежує сумарну оцінену вартість незавершених preview-задач окремо для кожного виду.
+    Черга — це колекція preview_jobs (спільна для всіх процесів API); завантаження,
+    які вже прийняті, але ще не дійшли до enqueue, резервуються локально.
+    Коли бюджет вичерпано, завантаження отримує 503 з Retry-After ще до запису в S3,
+    а не стоїть у черзі до таймауту. Для multipart POST /upload перевірка можлива
+    лише після того, як тіло вже прийняте; chunked POST /uploads перевіряє до
+    передачі першого байта.
+    """
+
+    def __init__(self, capacity: dict[str, float], workers: int):
+        self.capacity = capacity
+        self.workers = max(workers, 1)
+        self.admitted: Counter[str] = Counter()
+        self.rejected: Counter[str] = Counter()
+        self._reserved: defaultdict[str, float] = defaultdict(float)
+
+    @staticmethod
+    async def backlog() -> dict[str, dict]:
+        """
+        {вид: {"cost", "queued", "running", "oldest_queued"}} по queued задачах і running
+        з живим lease. Running із простроченим lease — це задачі мертвого воркера:
+        їх перезахопить черга або позначить failed reaper, бюджет вони не тримають.
+        """
+        now = datetime.now(timezone.utc)
+        pipeline = [
+            {"$match": {
+                "$or": [
+                    {"status": "queued"},
+                    {"status": "running", "locked_until": {"$gte": now}},
+                ],
+                "kind": {"$ne": None},
+            }},
+            {"$group": {
+                "_id": "$kind",
+                "cost": {"$sum": "$cost"},
+                "queued": {"$sum": {"$cond": [{"$eq": ["$status", "queued"]}, 1, 0]}},
+                "running": {"$sum": {"$cond": [{"$eq": ["$status", "running"]}, 1, 0]}},
+                "oldest_queued": {"$min": {"$cond": [{"$eq": ["$status", "queued"]}, "$created_at", None]}},
+            }},
+        ]
+        rows = await PreviewJob.get_motor_collection().aggregate(pipeline).to_list(None)
+        return {row.pop("_id"): row for row in rows}
+
+    def _retry_after(self, excess: float) -> int:
+        # надлишок розходиться приблизно з швидкістю `workers` секунд роботи за секунду
+        return max(1, min(math.ceil(excess / self.workers), 300))
+
+    async def check(self, file_type: str, size: int) -> float:
+        """Повертає оцінену вартість або кидає Overloaded, якщо черга цього виду заповнена."""
+        kind = media_kind(file_type)
+        if kind is None:
+            return 0.0
+        cost = estimate_cost(file_type, size)
+        queued = (await self.backlog()).get(kind, {}).get("cost", 0.0) + self._reserved[kind]
+        capacity = self.capacity.get(kind, math.inf)
+        # у порожню чергу приймаємо навіть файл, дорожчий за весь бюджет
+        if queued > 0 and queued + cost > capacity:
+            self.rejected[kind] += 1
+            raise Overloaded(kind, self._retry_after(queued + cost - capacity))
+        return cost
+
+    @asynccontextmanager
+    async def admit(self, file_type: str, size: int) -> AsyncIterator[float]:
+        """check() + резерв вартості до виходу з блоку (тобто до появи задачі в черзі)."""
+        cost = await self.check(file_type, size)
+        kind = media_kind(file_type)
+        if kind is None:
+            yield cost
+            return
+        self.admitted[kind] += 1
+        self._reserved[kind] += cost
+        try:
+            yield cost
+        finally:
+            self._reserved[kind] -= cost
+
+    async def stats(self) -> dict[str, dict]:
+        """Глибина черги, вартість і середні очікування/обробка по видах — для підбору кількості воркерів."""
+        now = datetime.now(timezone.utc)
+        backlog = await self.backlog()
+        recent = await PreviewJob.get_motor_collection().aggregate([
+            {"$match": {"status": "done", "finished_at": {"$gte": now - STATS_WINDOW}, "kind": {"$ne": None}}},
+            {"$group": {
+                "_id": "$kind",
+                "done": {"$sum": 1},
+                "avg_wait_ms": {"$avg": {"$subtract": ["$started_at", "$created_at"]}},
+                "avg_run_ms": {"$avg": {"$subtract": ["$finished_at", "$started_at"]}},
+                "cost": {"$sum": "$cost"},
+            }},
+        ]).to_list(None)
+        recent = {row.pop("_id"): row for row in recent}
+
+        result = {}
+        for kind in COST_MODEL:
+            b, r = backlog.get(kind, {}), recent.get(kind, {})
+            oldest = b.get("oldest_queued")
+            if oldest is not None and oldest.tzinfo is None:
+                oldest = oldest.replace(tzinfo=timezone.utc)
+            result[kind] = {
+                "capacity": self.capacity.get(kind),
+                "backlog_cost": round(b.get("cost", 0.0) + self._reserved[kind], 2),
+                "queued": b.get("queued", 0),
+                "running": b.get("running", 0),
+                "oldest_queued_s": round((now - oldest).total_seconds(), 1) if oldest else None,
+                "done_last_15m": r.get("done", 0),
+                "avg_wait_s": round(r["avg_wait_ms"] / 1000, 2) if r.get("avg_wait_ms") is not None else None,
+                "avg_run_s": round(r["avg_run_ms"] / 1000, 2) if r.get("avg_run_ms") is not None else None,
+                "estimated_cost_done": round(r.get("cost", 0.0), 2),
+                "admitted": self.admitted[kind],
+                "rejected": self.rejected[kind],
+            }
+        return result
+
+
+admission = AdmissionController(
+    capacity = settings.admission_capacity,
+    workers  = settings.preview_workers,
+)
@@ -12,6 +12,47 @@ class Settings(BaseSettings):
     aws_bucket_name:       str = Field(..., env="AWS_BUCKET_NAME")
     aws_region:            str = Field(..., env="AWS_REGION")
     aws_signature_version: str = Field("s3v4", env="AWS_SIGNATURE_VERSION")
+    aws_endpoint_url:      str | None = Field(None, env="AWS_ENDPOINT_URL")  # moto server / minio
+
+    s3_max_pool_connections: int = 50
+    s3_max_concurrency:      int = 32
+    s3_max_attempts:         int = 5
+    s3_connect_timeout:      float = 5.0
+    s3_read_timeout:         float = 60.0
+
+    signed_url_expires:        int = 3600  # секунд; thumbnail/preview/waveform
+    original_url_expires:      int = 300   # оригінали (платний вміст): коротко і без кешу
+    signed_url_cache_size:     int = 10_000
+    signed_url_safety_margin:  int = 120   # не віддаємо URL, якому лишилось менше
+
+    preview_workers:             int = 2
+    preview_job_timeout:         float = 120.0  # секунд на один файл
+    video_preview_timeout:       float = 480.0  # відео: постер + кліп через ffmpeg (менше за lease)
+    preview_max_jobs_per_worker: int = 50       # після цього процес перезапускається
+    preview_job_max_attempts:    int = 3
+    pdf_render_processes:        int = 4        # процесів на рендер сторінок одного PDF
+    max_image_pixels:            int = 64_000_000  # більші зображення відхиляються до декодування
+
+    upload_session_ttl:            int = 24 * 3600  # сесія без жодного PATCH стільки секунд вважається покинутою
+    upload_session_sweep_interval: float = 600.0
+
+    commission_flush_interval: float = 2.0  # як часто журнал покупок застосовується до авторів і файлів
+    commission_flush_batch:    int = 500    # записів журналу за один flush
+    commission_flush_lease:    int = 60     # після стількох секунд пачку мертвого flusher-а доводить інший
+
+    owned_cache_max_users: int = 50_000
+    owned_cache_ttl:       float = 60.0  # покупки з інших процесів видно із затримкою до ttl
+
+    near_duplicate_distance: int = 6  # макс. відстань Хеммінга між dHash
+
+    thumb_cache_dir:       str = "/tmp/one4lib-thumbs"
+    thumb_cache_max_bytes: int = 512 * 1024 * 1024
+    # бюджет незавершених preview-задач по видах, в оцінених секундах роботи воркера
+    admission_capacity: dict[str, float] = {"image": 300.0, "pdf": 120.0, "audio": 300.0, "video": 900.0}
+
+    preview_job_lease:           int = 600      # секунд, після яких running-задачу можна перезахопити
+    preview_queue_poll_interval: float = 2.0
+    preview_job_reap_interval:   float = 60.0   # як часто шукати running-задачі, що застрягли на останній спробі
 
     class Config:
         env_file = ".env"
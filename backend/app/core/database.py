@@ -0,0 +1,56 @@
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.models.account import User
+
+T = TypeVar("T")
+
+# скільки останніх токенів write-behind пам'ятає документ; replay пачки має
+# відбутися раніше, ніж той самий документ зачеплять стільки інших пачок
+APPLIED_TOKENS_KEPT = 100
+
+# None — ще не перевіряли; standalone mongod (локальна розробка) транзакцій не підтримує
+_transactions_supported: Optional[bool] = None
+
+
+def _client():
+    return User.get_motor_collection().database.client
+
+
+async def supports_transactions() -> bool:
+    global _transactions_supported
+    if _transactions_supported is None:
+        hello = await _client().admin.command("hello")
+        _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _transactions_supported
+
+
+async def run_in_transaction(fn: Callable[[Optional[AsyncIOMotorClientSession]], Awaitable[T]]) -> T:
+    """
+    Виконує fn(session) у multi-document транзакції з автоматичним повтором
+    на TransientTransactionError. Без replica set fn отримує session=None
+    і сам відповідає за компенсацію часткових записів.
+    """
+    if not await supports_transactions():
+        return await fn(None)
+    async with await _client().start_session() as session:
+        return await session.with_transaction(fn)
+
+
+def idempotent_inc(_id: Any, inc: dict, token: Any) -> UpdateOne:
+    """$inc, який з тим самим token застосовується до документа щонайбільше раз (для bulk_write)."""
+    return UpdateOne(
+        {"_id": _id, "applied_tokens": {"$ne": token}},
+        {
+            "$inc": inc,
+            "$push": {"applied_tokens": {"$each": [token], "$slice": -APPLIED_TOKENS_KEPT}},
+        },
+    )
+
+
+def ignore_duplicates(e: BulkWriteError) -> None:
+    """Пропускає BulkWriteError, якщо всі помилки — дублікати _id (повторна вставка тих самих записів)."""
+    errors = e.details.get("writeErrors", [])
+    if not errors or any(err.get("code") != 11000 for err in errors) or e.details.get("writeConcernErrors"):
+        raise e
@@ -4,6 +4,7 @@ from bson import ObjectId
 from app.models.account import User
 from app.core.security import decode_token
 from app.core.exceptions import CredentialsException, PermissionDenied
+from app.core.loaders import Loaders
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
@@ -42,3 +43,7 @@ async def get_current_admin(user: User = Depends(get_current_user)) -> User:
     if user.role != "admin":
         raise PermissionDenied()
     return user
+
+# Request-scoped batch loaders (новий набір на кожен запит)
+def get_loaders() -> Loaders:
+    return Loaders()
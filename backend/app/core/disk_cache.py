@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+
+
+class DiskLRUCache:
+    """
+    Кеш байтів на диску з обмеженням сумарного розміру.
+    Індекс (ключ -> розмір) тримається в пам'яті в LRU-порядку і відновлюється
+    при open() зі сканування каталогу за mtime. Дискові операції йдуть у потоці.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._index: OrderedDict[str, int] = OrderedDict()
+
+    def _path(self, name: str) -> Path:
+        return self.root / name[:2] / name
+
+    @staticmethod
+    def _name(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _scan(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for p in self.root.glob("*/*"):
+            if p.is_file() and not p.name.startswith("."):
+                st = p.stat()
+                entries.append((st.st_mtime, p.name, st.st_size))
+        entries.sort()
+        self._index = OrderedDict((name, size) for _, name, size in entries)
+        self.size = sum(self._index.values())
+        self._evict()
+
+    async def open(self) -> None:
+        await asyncio.to_thread(self._scan)
+
+    def _evict(self) -> None:
+        while self.size > self.max_bytes and self._index:
+            name, size = self._index.popitem(last=False)
+            self.size -= size
+            try:
+                self._path(name).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _read(self, name: str) -> bytes | None:
+        path = self._path(name)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # mtime = час останнього доступу, щоб LRU пережив рестарт
+        return data
+
+    def _write(self, name: str, data: bytes) -> None:
+        path = self._path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # атомарний запис: тимчасовий файл + rename
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    async def get(self, key: str) -> bytes | None:
+        name = self._name(key)
+        if name not in self._index:
+            self.misses += 1
+            return None
+        data = await asyncio.to_thread(self._read, name)
+        if data is None:
+            self.size -= self._index.pop(name, 0)
+            self.misses += 1
+            return None
+        self._index.move_to_end(name)
+        self.hits += 1
+        return data
+
+    async def put(self, key: str, data: bytes) -> None:
+        name = self._name(key)
+        await asyncio.to_thread(self._write, name, data)
+        self.size -= self._index.pop(name, 0)
+        self._index[name] = len(data)
+        self.size += len(data)
+        self._evict()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._index), "bytes": self.size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,82 @@
+from itertools import combinations
+from typing import Generic, Hashable, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+CHUNKS = 4        # 64-бітний хеш ділиться на 4 частини по 16 біт
+CHUNK_BITS = 16
+_CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _flips(radius: int) -> list[int]:
+    """Усі 16-бітні маски з не більше ніж radius одиницями."""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), r):
+            m = 0
+            for b in bits:
+                m |= 1 << b
+            masks.append(m)
+    return masks
+
+
+class MultiIndexHashTable(Generic[T]):
+    """
+    Multi-index hashing для пошуку 64-бітних хешів в межах відстані Хеммінга k.
+    Якщо dist(a, b) <= k, то хоча б одна з 4 частин відрізняється не більше ніж
+    на k // 4 біт (принцип Діріхле) — тож перебираються лише сусідні ключі
+    у 4 таблицях, а кандидати перевіряються точною відстанню.
+    """
+
+    def __init__(self):
+        self._tables: list[dict[int, set[tuple[int, T]]]] = [{} for _ in range(CHUNKS)]
+        self._size = 0
+        self._flips_cache: dict[int, list[int]] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _chunks(h: int) -> list[int]:
+        return [(h >> (i * CHUNK_BITS)) & _CHUNK_MASK for i in range(CHUNKS)]
+
+    def add(self, h: int, item: T) -> None:
+        entry = (h, item)
+        if entry in self._tables[0].get(h & _CHUNK_MASK, ()):
+            return
+        for table, chunk in zip(self._tables, self._chunks(h)):
+            table.setdefault(chunk, set()).add(entry)
+        self._size += 1
+
+    def remove(self, h: int, item: T) -> None:
+        entry = (h, item)
+        for table, chunk in zip(self._tables, self._chunks(h)):
+            bucket = table.get(chunk)
+            if bucket is None or entry not in bucket:
+                return
+            bucket.discard(entry)
+            if not bucket:
+                del table[chunk]
+        self._size -= 1
+
+    def query(self, h: int, k: int) -> list[tuple[T, int]]:
+        radius = k // CHUNKS
+        flips = self._flips_cache.get(radius)
+        if flips is None:
+            flips = self._flips_cache[radius] = _flips(radius)
+        seen: set[tuple[int, T]] = set()
+        found = []
+        for table, chunk in zip(self._tables, self._chunks(h)):
+            for m in flips:
+                for entry in table.get(chunk ^ m, ()):
+                    if entry in seen:
+                        continue
+                    seen.add(entry)
+                    d = hamming(h, entry[0])
+                    if d <= k:
+                        found.append((entry[1], d))
+        return found
@@ -0,0 +1,106 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Iterable, List, Optional, TypeVar
+from beanie import PydanticObjectId
+from app.models.account import User
+from app.models.files import File
+from .ownership import owned_files
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+BatchFn = Callable[[List[K]], Awaitable[Dict[K, V]]]
+
+
+class DataLoader(Generic[K, V]):
+    """
+    Збирає всі load() в межах одного проходу event loop і виконує
+    один batch-запит (зазвичай `$in`) замість N окремих.
+    Результати кешуються на час життя loader-а (тобто одного запиту).
+    """
+
+    # event loop тримає на задачі лише слабке посилання — без цього batch міг би
+    # бути зібраний GC посеред запиту, і load() не завершився б ніколи
+    _dispatching: set[asyncio.Task] = set()
+
+    def __init__(self, batch_fn: BatchFn):
+        self._batch_fn = batch_fn
+        self._cache: Dict[K, asyncio.Future] = {}
+        self._queue: List[K] = []
+
+    def load(self, key: K) -> Awaitable[Optional[V]]:
+        fut = self._cache.get(key)
+        if fut is not None:
+            return fut
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._cache[key] = fut
+        self._queue.append(key)
+        if len(self._queue) == 1:
+            # відкладаємо dispatch, щоб інші корутини встигли додати свої ключі
+            loop.call_soon(self._schedule_dispatch)
+        return fut
+
+    async def load_many(self, keys: Iterable[K]) -> List[Optional[V]]:
+        return list(await asyncio.gather(*(self.load(k) for k in keys)))
+
+    def prime(self, key: K, value: V) -> None:
+        if key in self._cache:
+            return
+        fut = asyncio.get_running_loop().create_future()
+        fut.set_result(value)
+        self._cache[key] = fut
+
+    def _schedule_dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        task = asyncio.ensure_future(self._dispatch(keys))
+        DataLoader._dispatching.add(task)
+        task.add_done_callback(DataLoader._dispatching.discard)
+
+    async def _dispatch(self, keys: List[K]) -> None:
+        try:
+            found = await self._batch_fn(keys)
+        except Exception as e:
+            for k in keys:
+                fut = self._cache.pop(k)
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for k in keys:
+            fut = self._cache[k]
+            if not fut.done():
+                fut.set_result(found.get(k))
+
+
+async def _batch_users(ids: List[PydanticObjectId]) -> Dict[PydanticObjectId, User]:
+    docs = await User.find({"_id": {"$in": ids}}).to_list()
+    return {doc.id: doc for doc in docs}
+
+
+async def _batch_files(ids: List[PydanticObjectId]) -> Dict[PydanticObjectId, File]:
+    docs = await File.find({"_id": {"$in": ids}}).to_list()
+    return {doc.id: doc for doc in docs}
+
+
+def _batch_purchased(uid: PydanticObjectId) -> BatchFn:
+    async def _load(fids: List[PydanticObjectId]) -> Dict[PydanticObjectId, bool]:
+        owned = await owned_files.get(uid)
+        return {fid: fid in owned for fid in fids}
+    return _load
+
+
+class Loaders:
+    """Набір DataLoader-ів, що живе рівно один HTTP-запит."""
+
+    def __init__(self):
+        self.users: DataLoader[PydanticObjectId, User] = DataLoader(_batch_users)
+        self.files: DataLoader[PydanticObjectId, File] = DataLoader(_batch_files)
+        self._purchased: Dict[PydanticObjectId, DataLoader[PydanticObjectId, bool]] = {}
+
+    def purchased(self, user_id: Any) -> DataLoader[PydanticObjectId, bool]:
+        """Loader `file_id -> bool` (чи купив цей користувач файл)."""
+        uid = PydanticObjectId(user_id)
+        loader = self._purchased.get(uid)
+        if loader is None:
+            loader = DataLoader(_batch_purchased(uid))
+            self._purchased[uid] = loader
+        return loader
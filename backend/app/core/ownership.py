@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+from beanie import PydanticObjectId
+from app.models.file_purchase import FilePurchaseTransaction
+from .config import settings
+
+
+class OwnedFilesCache:
+    """
+    In-process кеш "які файли купив користувач": user_id -> frozenset(file_id).
+    Набір вантажиться одним запитом по індексу (user_id, file_id) лише з file_id,
+    після чого viewer_status — перевірка входження в множину.
+
+    Покупка в цьому процесі скидає набір покупця одразу; покупки, зроблені через
+    інші процеси API, стають видимими не пізніше ніж за `ttl` секунд.
+    """
+
+    def __init__(self, max_users: int, ttl: float):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._sets: OrderedDict[PydanticObjectId, tuple[float, frozenset]] = OrderedDict()
+        # лічильник скидань: завантаження, що почалося до покупки, не перезапише кеш старим набором
+        self._generation: dict[PydanticObjectId, int] = {}
+
+    async def get(self, user_id) -> frozenset:
+        uid = PydanticObjectId(user_id)
+        entry = self._sets.get(uid)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self._sets.move_to_end(uid)
+            return entry[1]
+
+        generation = self._generation.get(uid, 0)
+        cursor = FilePurchaseTransaction.get_motor_collection().find(
+            {"user_id": uid}, projection={"_id": 0, "file_id": 1},
+        )
+        owned = frozenset([raw["file_id"] async for raw in cursor])
+        if self._generation.get(uid, 0) == generation:
+            self._sets[uid] = (time.monotonic(), owned)
+            self._sets.move_to_end(uid)
+            while len(self._sets) > self.max_users:
+                self._sets.popitem(last=False)
+        return owned
+
+    async def owns(self, user_id, file_id) -> bool:
+        return PydanticObjectId(file_id) in await self.get(user_id)
+
+    def invalidate(self, user_id) -> None:
+        uid = PydanticObjectId(user_id)
+        self._sets.pop(uid, None)
+        self._generation[uid] = self._generation.get(uid, 0) + 1
+
+
+owned_files = OwnedFilesCache(
+    max_users = settings.owned_cache_max_users,
+    ttl       = settings.owned_cache_ttl,
+)
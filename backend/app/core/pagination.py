@@ -0,0 +1,59 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+DEFAULT_PAGE_LIMIT = 24
+MAX_PAGE_LIMIT = 100
+
+# поле сортування -> як (де)серіалізувати його значення в курсорі
+SORT_FIELDS = {
+    "upload_date": (datetime.isoformat, datetime.fromisoformat),
+    "purchase_count": (int, int),
+    "price": (int, int),
+}
+
+
+class InvalidCursor(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def encode_cursor(sort: str, order: str, value: Any, oid: ObjectId) -> str:
+    dump, _ = SORT_FIELDS[sort]
+    raw = json.dumps({"s": sort, "o": order, "v": dump(value), "id": str(oid)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> tuple[Any, ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        # курсор дійсний лише для того самого сортування
+        if payload["s"] != sort or payload["o"] != order:
+            raise ValueError()
+        _, load = SORT_FIELDS[sort]
+        return load(payload["v"]), ObjectId(payload["id"])
+    except Exception:
+        raise InvalidCursor()
+
+
+def keyset_query(sort: str, order: str, cursor: Optional[str]) -> tuple[dict, list]:
+    """
+    Повертає (умову "після курсора", sort-специфікацію) для пагінації
+    по (sort, _id). Сортування завжди збігається з compound-індексом,
+    тому глибина сторінки не впливає на час запиту.
+    """
+    direction = -1 if order == "desc" else 1
+    sort_spec = [(sort, direction), ("_id", direction)]
+    if not cursor:
+        return {}, sort_spec
+    value, oid = decode_cursor(cursor, sort, order)
+    op = "$lt" if direction == -1 else "$gt"
+    cond = {"$or": [
+        {sort: {op: value}},
+        {sort: value, "_id": {op: oid}},
+    ]}
+    return cond, sort_spec
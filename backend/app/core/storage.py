@@ -1,30 +1,235 @@
+import asyncio
+import threading
+import time
 import uuid
-import boto3
-from botocore.client import Config
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Awaitable, Callable
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from botocore.exceptions import ClientError
 from .config import settings
 
-# Ініціалізуємо S3-клієнт з параметрами з Settings
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id     = settings.aws_access_key_id,
-    aws_secret_access_key = settings.aws_secret_access_key,
-    region_name           = settings.aws_region,
-    config                = Config(signature_version=settings.aws_signature_version),
-)
+# Асинхронний S3-клієнт з пулом з'єднань; створюється у lifespan через start()
+_exit_stack: AsyncExitStack | None = None
+s3 = None
+# обмеження одночасних запитів до S3 з одного процесу
+_s3_limit = asyncio.Semaphore(settings.s3_max_concurrency)
 
-def upload_fileobj(file_obj, content_type: str) -> str:
-    key = f"uploads/{uuid.uuid4()}"
-    s3.upload_fileobj(
-        Fileobj   = file_obj,
-        Bucket    = settings.aws_bucket_name,
-        Key       = key,
-        ExtraArgs = {"ContentType": content_type, "ACL": "private"},
-    )
+async def start() -> None:
+    global _exit_stack, s3
+    if s3 is not None:
+        return
+    session = get_session()
+    _exit_stack = AsyncExitStack()
+    s3 = await _exit_stack.enter_async_context(session.create_client(
+        "s3",
+        aws_access_key_id     = settings.aws_access_key_id,
+        aws_secret_access_key = settings.aws_secret_access_key,
+        region_name           = settings.aws_region,
+        endpoint_url          = settings.aws_endpoint_url,
+        config                = AioConfig(
+            signature_version    = settings.aws_signature_version,
+            max_pool_connections = settings.s3_max_pool_connections,
+            connect_timeout      = settings.s3_connect_timeout,
+            read_timeout         = settings.s3_read_timeout,
+            retries              = {"max_attempts": settings.s3_max_attempts, "mode": "adaptive"},
+        ),
+    ))
+    if settings.aws_endpoint_url:
+        # локальний S3 (moto server / minio) — створюємо bucket, якщо його ще немає
+        try:
+            await s3.head_bucket(Bucket=settings.aws_bucket_name)
+        except ClientError:
+            await s3.create_bucket(Bucket=settings.aws_bucket_name)
+
+async def close() -> None:
+    global _exit_stack, s3
+    if _exit_stack is not None:
+        await _exit_stack.aclose()
+    _exit_stack, s3 = None, None
+
+# S3 вимагає щонайменше 5 MB на part (крім останнього)
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+
+def new_key() -> str:
+    return f"uploads/{uuid.uuid4()}"
+
+async def _read_chunk(read: Callable[[int], Awaitable[bytes]]) -> bytes:
+    # read(n) може повернути менше n байтів до кінця потоку — добираємо до повного part
+    buf = bytearray()
+    while len(buf) < MULTIPART_CHUNK_SIZE:
+        piece = await read(MULTIPART_CHUNK_SIZE - len(buf))
+        if not piece:
+            break
+        buf += piece
+    return bytes(buf)
+
+async def upload_bytes(data: bytes, content_type: str, key: str | None = None) -> str:
+    key = key or new_key()
+    async with _s3_limit:
+        await s3.put_object(
+            Bucket      = settings.aws_bucket_name,
+            Key         = key,
+            Body        = data,
+            ContentType = content_type,
+            ACL         = "private",
+        )
+    return key
+
+async def create_multipart_upload(key: str, content_type: str) -> str:
+    async with _s3_limit:
+        mpu = await s3.create_multipart_upload(
+            Bucket=settings.aws_bucket_name, Key=key, ContentType=content_type, ACL="private",
+        )
+    return mpu["UploadId"]
+
+async def upload_part(key: str, upload_id: str, part_number: int, data: bytes) -> dict:
+    """Повертає опис part-а для complete_multipart_upload."""
+    async with _s3_limit:
+        resp = await s3.upload_part(
+            Bucket=settings.aws_bucket_name, Key=key, UploadId=upload_id,
+            PartNumber=part_number, Body=data,
+        )
+    return {"ETag": resp["ETag"], "PartNumber": part_number}
+
+async def complete_multipart_upload(key: str, upload_id: str, parts: list[dict]) -> None:
+    async with _s3_limit:
+        try:
+            await s3.complete_multipart_upload(
+                Bucket=settings.aws_bucket_name, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except ClientError as e:
+            # повтор після втраченої відповіді: upload уже зібрано в об'єкт
+            if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                raise
+            await s3.head_object(Bucket=settings.aws_bucket_name, Key=key)
+
+async def abort_multipart_upload(key: str, upload_id: str) -> None:
+    try:
+        await s3.abort_multipart_upload(Bucket=settings.aws_bucket_name, Key=key, UploadId=upload_id)
+    except ClientError as e:
+        # вже завершений або скасований upload — прибирати нічого
+        if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+            raise
+
+async def upload_stream(read: Callable[[int], Awaitable[bytes]], content_type: str) -> str:
+    """
+    Завантажує потік у S3 частинами (multipart upload), не тримаючи весь файл у пам'яті:
+    одночасно в пам'яті щонайбільше два chunk-и. Файл, що вміщується в один chunk,
+    йде звичайним put_object.
+    """
+    chunk = await _read_chunk(read)
+    nxt = await _read_chunk(read) if len(chunk) == MULTIPART_CHUNK_SIZE else b""
+    if not nxt:
+        return await upload_bytes(chunk, content_type)
+
+    key = new_key()
+    upload_id = await create_multipart_upload(key, content_type)
+    parts = []
+    try:
+        while chunk:
+            parts.append(await upload_part(key, upload_id, len(parts) + 1, chunk))
+            chunk, nxt = nxt, (await _read_chunk(read) if nxt else b"")
+        await complete_multipart_upload(key, upload_id, parts)
+    except BaseException:
+        await abort_multipart_upload(key, upload_id)
+        raise
     return key
 
-def create_signed_url(key: str, expires: int = 300) -> str:
-    return s3.generate_presigned_url(
-        ClientMethod = "get_object",
+async def download_bytes(key: str) -> bytes:
+    """Лише для невеликих об'єктів (thumbnail/preview); великі — через download_to_file."""
+    async with _s3_limit:
+        resp = await s3.get_object(Bucket=settings.aws_bucket_name, Key=key)
+        async with resp["Body"] as body:
+            return await body.read()
+
+async def iter_object(key: str) -> AsyncIterator[bytes]:
+    """Читає об'єкт chunk-ами по MULTIPART_CHUNK_SIZE, не тримаючи його в пам'яті."""
+    async with _s3_limit:
+        resp = await s3.get_object(Bucket=settings.aws_bucket_name, Key=key)
+        async with resp["Body"] as body:
+            while chunk := await body.read(MULTIPART_CHUNK_SIZE):
+                yield chunk
+
+async def download_to_file(key: str, file_obj) -> None:
+    async for chunk in iter_object(key):
+        file_obj.write(chunk)
+
+async def delete_object(key: str) -> None:
+    async with _s3_limit:
+        await s3.delete_object(Bucket=settings.aws_bucket_name, Key=key)
+    signed_url_cache.invalidate(key)
+
+class SignedUrlCache:
+    """
+    LRU-кеш підписаних URL з урахуванням терміну дії.
+    URL віддається повторно, доки до його `ExpiresIn` лишається більше ніж
+    `safety_margin` секунд — так клієнт отримує стабільні URL і кешує картинки.
+    Ключ — (key, method, expires): запит з коротшим терміном не отримає
+    довгоживучий URL, а з довшим — URL, що от-от протухне.
+    """
+
+    def __init__(self, max_size: int, safety_margin: int):
+        self.max_size = max_size
+        self.safety_margin = safety_margin
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[tuple[str, str, int], tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, method: str, expires: int) -> str | None:
+        k = (key, method, expires)
+        with self._lock:
+            item = self._items.get(k)
+            if item is not None:
+                url, expires_at = item
+                # для коротких URL запас не більший за половину терміну
+                if expires_at - time.monotonic() > min(self.safety_margin, expires / 2):
+                    self._items.move_to_end(k)
+                    self.hits += 1
+                    return url
+                del self._items[k]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, method: str, url: str, expires: int) -> None:
+        k = (key, method, expires)
+        with self._lock:
+            self._items[k] = (url, time.monotonic() + expires)
+            self._items.move_to_end(k)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            for k in [k for k in self._items if k[0] == key]:
+                del self._items[k]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+signed_url_cache = SignedUrlCache(
+    max_size      = settings.signed_url_cache_size,
+    safety_margin = settings.signed_url_safety_margin,
+)
+
+async def create_signed_url(
+        key: str, expires: int | None = None, method: str = "get_object", cache: bool = True,
+) -> str:
+    """cache=False — свіжий підпис на кожен запит (посилання на оригінал не мають розходитися)."""
+    expires = expires or settings.signed_url_expires
+    url = signed_url_cache.get(key, method, expires) if cache else None
+    if url is not None:
+        return url
+    url = await s3.generate_presigned_url(
+        ClientMethod = method,
         Params       = {"Bucket": settings.aws_bucket_name, "Key": key},
         ExpiresIn    = expires,
     )
+    if cache:
+        signed_url_cache.put(key, method, url, expires)
+    return url
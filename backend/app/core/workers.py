@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from multiprocessing.connection import Connection
+from typing import Any, Callable
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+
+class PreviewTimeout(TimeoutError):
+    """Задача пулу не вклалася в таймаут; її процес уже вбито."""
+
+    def __init__(self, name: str = "job"):
+        super().__init__(f"Preview generation timed out ({name})")
+
+
+def _worker_main(conn: Connection) -> None:
+    # власна група процесів: при таймауті вбивається воркер разом з усім, що він
+    # породив (fork-пул рендеру сторінок PDF, ffmpeg)
+    os.setsid()
+    while True:
+        job = conn.recv()
+        if job is None:
+            return
+        fn, args = job
+        try:
+            result = (True, fn(*args))
+        except BaseException as e:
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception as e:
+            # результат або виняток не серіалізується
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+async def _readable(conn: Connection) -> None:
+    """Чекає, поки в pipe з'являться дані, не займаючи потік."""
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    fd = conn.fileno()
+    loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        loop.remove_reader(fd)
+
+
+class _Worker:
+    """Один процес пулу; виконує рівно одну задачу за раз."""
+
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.jobs = 0
+
+    def kill(self) -> None:
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def retire(self) -> None:
+        """Просить процес завершитись після поточної (вже виконаної) задачі, не чекаючи."""
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.conn.close()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class ProcessPool:
+    """
+    Пул процесів для CPU-важкої роботи (PIL, PyMuPDF, librosa), щоб вона
+    не блокувала event loop. Створюється/зупиняється у lifespan застосунку.
+    Процеси перезапускаються після `max_jobs_per_worker` задач, щоб
+    обмежити ріст пам'яті. Кожен процес виконує одну задачу за раз, тож
+    таймаут вбиває лише процес завислої задачі, а решта продовжує роботу.
+    """
+
+    def __init__(self, workers: int, timeout: float, max_jobs_per_worker: int):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        # spawn: воркер не успадковує event loop і з'єднання батьківського процесу
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: asyncio.Queue[_Worker] | None = None
+        self._all: set[_Worker] = set()
+
+    def start(self) -> None:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self.workers):
+                self._idle.put_nowait(self._spawn())
+
+    def shutdown(self) -> None:
+        if self._idle is not None:
+            for worker in list(self._all):
+                worker.stop()
+            self._all.clear()
+            self._idle = None
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._ctx)
+        self._all.add(worker)
+        return worker
+
+    def _replace(self, worker: _Worker, kill: bool) -> _Worker:
+        self._all.discard(worker)
+        if kill:
+            worker.kill()
+        else:
+            worker.retire()
+        return self._spawn()
+
+    @staticmethod
+    async def _result(worker: _Worker) -> tuple[bool, Any]:
+        await _readable(worker.conn)
+        # процес уже відповідає: потік лише дочитує повідомлення (результат буває
+        # на мегабайти більшим за буфер pipe), а не чекає, поки процес звільниться
+        return await asyncio.to_thread(worker.conn.recv)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: float | None = None) -> Any:
+        if self._idle is None:
+            # пул не запущено (скрипти, CLI) — виконуємо у потоці
+            return await asyncio.to_thread(fn, *args)
+        name = getattr(fn, "__qualname__", fn)
+        idle = self._idle
+        worker = await idle.get()
+        try:
+            if worker.jobs >= self.max_jobs_per_worker:
+                worker = self._replace(worker, kill=False)
+            worker.conn.send((fn, args))
+            ok, result = await asyncio.wait_for(self._result(worker), timeout or self.timeout)
+            worker.jobs += 1
+        except asyncio.TimeoutError:
+            log.warning("process pool job %s timed out, killing its worker", name)
+            worker = self._replace(worker, kill=True)
+            raise PreviewTimeout(str(name))
+        except (EOFError, OSError):
+            # процес упав (OOM killer, segfault у нативній бібліотеці)
+            worker = self._replace(worker, kill=True)
+            raise RuntimeError(f"process pool worker died while running {name}")
+        except BaseException:
+            # скасування посеред задачі: процес ще зайнятий нею, тож він не повертається в пул
+            worker = self._replace(worker, kill=True)
+            raise
+        finally:
+            if idle is self._idle:
+                idle.put_nowait(worker)
+        if not ok:
+            raise result
+        return result
+
+
+preview_pool = ProcessPool(
+    workers             = settings.preview_workers,
+    timeout             = settings.preview_job_timeout,
+    max_jobs_per_worker = settings.preview_max_jobs_per_worker,
+)
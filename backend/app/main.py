@@ -3,7 +3,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
 
+from app.core import storage
 from app.core.config import settings
+from app.core.workers import preview_pool
+from app.services.preview_jobs import PreviewJobService
+from app.services.thumbs import thumb_cache
+from app.services.near_duplicates import NearDuplicateService
+from app.services.uploads import UploadService
+from app.services.file_purchase import FilePurchaseService
 
 from app.models.account import User
 from app.models.files import File
@@ -11,6 +18,9 @@ from app.models.points import PointPurchaseTransaction, PointRewardTransaction
 from app.models.comments import Comment
 from app.models.ratings import Rating
 from app.models.file_purchase import FilePurchaseTransaction
+from app.models.preview_jobs import PreviewJob
+from app.models.blobs import ContentBlob
+from app.models.uploads import UploadSession
 
 from app.api.v1.endpoints.account import router as account_router
 from app.api.v1.endpoints.files import router as files_router
@@ -37,11 +47,27 @@ async def lifespan(application: FastAPI):
             Comment,
             Rating,
             FilePurchaseTransaction,
+            PreviewJob,
+            ContentBlob,
+            UploadSession,
         ],
     )
 
+    await NearDuplicateService.rebuild()
+    await storage.start()
+    await thumb_cache.open()
+    preview_pool.start()
+    PreviewJobService.start()
+    UploadService.start()
+    await FilePurchaseService.start()
+
     yield
 
+    await FilePurchaseService.stop()
+    await UploadService.stop()
+    await PreviewJobService.stop()
+    preview_pool.shutdown()
+    await storage.close()
     client.close()
 
 app = FastAPI(lifespan=lifespan,
@@ -56,6 +82,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Location", "Upload-Offset", "Upload-Length", "Upload-File-Id"],
 )
 
 # API routes
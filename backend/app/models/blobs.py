@@ -0,0 +1,32 @@
+from __future__ import annotations
+from datetime import datetime, timezone
+from typing import Dict, List
+from beanie import Document, Indexed, PydanticObjectId
+from pydantic import BaseModel, Field
+from bson import ObjectId
+
+
+class BlobVariants(BaseModel):
+    """Вже згенеровані варіанти для вмісту, оброблений як певний file_type."""
+    file_type: str
+    thumbnail_key: str | None = None
+    preview_key: str | None = None
+    thumbnail_variants: Dict[str, str] = Field(default_factory=dict)
+    waveform_key: str | None = None
+    phash: str | None = None
+    generated_at: datetime | None = None
+
+
+class ContentBlob(Document):
+    """Індекс вмісту за SHA-256: однакові байти зберігаються в S3 і обробляються один раз."""
+    id: PydanticObjectId = Field(default_factory=ObjectId, alias="_id")
+    sha256: Indexed(str, unique=True)
+    key: Indexed(str)  # S3 object key оригіналу
+    size: int
+    content_type: str | None = None
+    ref_count: int = 0  # скільки File посилаються на цей вміст
+    variants: List[BlobVariants] = Field(default_factory=list)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    class Settings:
+        name = "content_blobs"
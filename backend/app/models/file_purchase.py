@@ -3,6 +3,7 @@ from datetime import datetime, timezone
 from beanie import Document, PydanticObjectId
 from pydantic import Field
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 
 
 class FilePurchaseTransaction(Document):
@@ -12,7 +13,24 @@ class FilePurchaseTransaction(Document):
     points_spent: int
     user_id: PydanticObjectId
     file_id: PydanticObjectId
+    # журнал комісій: лічильник файлу і комісія автора застосовуються фоновим
+    # flusher-ом пачками; settled=False — ще не застосовано
+    author_id: PydanticObjectId | None = None
+    commission: int = 0
+    settled: bool = True
+    settled_at: datetime | None = None
+    # пачка flush-а, що зараз застосовує запис, і lease цієї пачки
+    flush_token: PydanticObjectId | None = None
+    flush_until: datetime | None = None
 
     class Settings:
         name = "file_purchase_transactions"
-        indexes = ["user_id", "file_id"]
\ No newline at end of file
+        indexes = [
+            # один файл купується користувачем щонайбільше раз; індекс також покриває
+            # запити "що купив користувач" (префікс user_id)
+            IndexModel([("user_id", ASCENDING), ("file_id", ASCENDING)], unique=True),
+            "file_id",
+            IndexModel([("settled", ASCENDING), ("created_at", ASCENDING)]),
+            IndexModel([("author_id", ASCENDING), ("settled", ASCENDING)]),
+            IndexModel([("flush_token", ASCENDING)], partialFilterExpression={"settled": False}),
+        ]
\ No newline at end of file
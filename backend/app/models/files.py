@@ -1,9 +1,10 @@
 from __future__ import annotations
 from datetime import datetime, timezone
-from typing import List
+from typing import Dict, List
 from beanie import Document, PydanticObjectId
 from pydantic import Field, conint
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 
 class File(Document):
@@ -12,8 +13,14 @@ class File(Document):
     id: PydanticObjectId = Field(default_factory=ObjectId, alias="_id")
     author_id: PydanticObjectId
     file_key: str  # S3 object key
-    thumbnail_key: str # S3 object key
-    preview_key: str # S3 object key
+    content_sha256: str | None = None # ключ у content_blobs (спільний для однакових файлів)
+    thumbnail_key: str | None = None # S3 object key
+    preview_key: str | None = None # S3 object key
+    variants_status: str = "ready" # "pending" | "ready" | "failed"
+    thumbnail_variants: Dict[str, str] = Field(default_factory=dict) # {"256w.webp": S3 key}
+    waveform_key: str | None = None # огинаюча аудіо (int8 min/max), для waveform на фронтенді
+    phash: str | None = None # dHash зображення (16 hex), для пошуку майже-дублікатів
+    near_duplicates: List[PydanticObjectId] = Field(default_factory=list)
     file_type: str # "image" | "video" | "audio" | "document" | "archive"
     title: str
     description: str | None = None
@@ -24,4 +31,11 @@ class File(Document):
 
     class Settings:
         name = "files"
-        indexes = ["author_id", "tags"]
\ No newline at end of file
+        indexes = [
+            "author_id",
+            "tags",
+            # keyset-пагінація каталогу: (поле сортування, _id)
+            IndexModel([("upload_date", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("purchase_count", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("price", ASCENDING), ("_id", ASCENDING)]),
+        ]
\ No newline at end of file
@@ -2,6 +2,7 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from beanie import Document, PydanticObjectId
 from pydantic import Field
+from pymongo import ASCENDING, IndexModel
 
 
 class PointPurchaseTransaction(Document):
@@ -30,7 +31,11 @@ class PointRewardTransaction(Document):
 
     class Settings:
         name = "point_reward_tx"
-        indexes = ["user_id"]
+        indexes = [
+            "user_id",
+            # зведення комісії автора (поле в базі — userId)
+            IndexModel([("userId", ASCENDING), ("reason", ASCENDING)]),
+        ]
 
     class Config:
         allow_population_by_field_name = True
@@ -0,0 +1,49 @@
+from __future__ import annotations
+from datetime import datetime, timezone
+from beanie import Document, PydanticObjectId
+from pydantic import Field
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+
+
+class PreviewJob(Document):
+    """Задача генерації thumbnail/preview; колекція слугує локальною чергою замість брокера."""
+    id: PydanticObjectId = Field(default_factory=ObjectId, alias="_id")
+    file_id: PydanticObjectId
+    file_type: str  # те, що передається у PreviewService.generate_variants
+    content_type: str | None = None  # content type оригіналу (для preview)
+    kind: str | None = None  # вид для admission control: image | pdf | audio | video
+    cost: float = 0.0  # оцінка вартості в секундах роботи воркера
+    status: str = "queued"  # "queued" | "running" | "done" | "failed"
+    attempts: int = 0
+    error: str | None = None
+    locked_until: datetime | None = None  # lease для running-задачі
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: datetime | None = None  # останнє захоплення воркером
+    finished_at: datetime | None = None
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    class Settings:
+        name = "preview_jobs"
+        indexes = [
+            "file_id",
+            IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+            IndexModel([("status", ASCENDING), ("kind", ASCENDING)]),
+        ]
+
+
+class VariantRegenerationRun(Document):
+    """Checkpoint масової регенерації варіантів: прогін продовжується з last_file_id."""
+    id: str = Field(alias="_id")  # ім'я прогону (--run-id)
+    file_types: list[str] = Field(default_factory=list)  # фільтр за префіксом file_type
+    last_file_id: PydanticObjectId | None = None  # усі файли з меншим _id вже оброблені
+    processed: dict[str, int] = Field(default_factory=dict)  # {вид файлу: кількість}
+    skipped: int = 0
+    failed: int = 0
+    failed_ids: list[PydanticObjectId] = Field(default_factory=list)
+    started_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: datetime | None = None
+
+    class Settings:
+        name = "variant_regeneration_runs"
@@ -0,0 +1,38 @@
+from __future__ import annotations
+from datetime import datetime, timezone
+from typing import Dict, List
+from beanie import Document, PydanticObjectId
+from pydantic import Field
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+
+
+class UploadSession(Document):
+    """Стан chunked-завантаження: chunk-и пишуться одразу в S3 multipart upload."""
+    id: PydanticObjectId = Field(default_factory=ObjectId, alias="_id")
+    author_id: PydanticObjectId
+    key: str  # S3 object key майбутнього оригіналу
+    s3_upload_id: str
+    size: int  # заявлена повна довжина (Upload-Length)
+    offset: int = 0  # скільки байтів уже збережено в part-ах
+    parts: List[Dict] = Field(default_factory=list)  # [{"ETag", "PartNumber"}] для complete
+    # lease запиту, що зараз пише наступний part (токен + термін)
+    writer: str | None = None
+    writer_until: datetime | None = None
+    content_type: str
+    meta: Dict  # FileUploadRequest, з яким файл буде зареєстровано
+    status: str = "active"  # "active" | "completing" | "done"
+    # фіналізація: кожен крок фіксується, щоб обірвану можна було повторити
+    assembled: bool = False  # part-и зібрано в об'єкт key
+    sha256: str | None = None
+    locked_until: datetime | None = None  # lease процесу, що зараз фіналізує
+    file_id: PydanticObjectId | None = None  # File, створений при фіналізації
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires_at: datetime
+
+    class Settings:
+        name = "upload_sessions"
+        indexes = [
+            "author_id",
+            IndexModel([("status", ASCENDING), ("expires_at", ASCENDING)]),
+        ]
@@ -1,9 +1,31 @@
-from pydantic import BaseModel, Field
+from typing import Annotated
+from bson import ObjectId
+from pydantic import AfterValidator, BaseModel, Field
 from datetime import datetime
 
 
+def _object_id(value: str) -> str:
+    # некоректний id — 422 на валідації, а не InvalidId (500) у сервісі
+    if not ObjectId.is_valid(value):
+        raise ValueError("must be a 24-character hex ObjectId")
+    return value
+
+
+ObjectIdStr = Annotated[str, AfterValidator(_object_id)]
+
+
 class PurchaseFileRequest(BaseModel):
-    file_id: str
+    file_id: ObjectIdStr
+
+
+class CartPurchaseRequest(BaseModel):
+    file_ids: list[ObjectIdStr] = Field(..., min_length=1, max_length=100)
+
+
+class CartPurchaseResponse(BaseModel):
+    purchased: list[str]
+    skipped: list[str]  # уже куплені раніше
+    points_spent: int
 
 
 class TransactionResponse(BaseModel):
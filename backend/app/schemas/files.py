@@ -1,5 +1,5 @@
 from pydantic import BaseModel, constr, Field, conint
-from typing import List, Optional
+from typing import Dict, List, Optional
 import datetime as _dt
 
 
@@ -23,11 +23,37 @@ class FileResponse(BaseModel):
     upload_date: _dt.datetime
 
     thumbnail_url: Optional[str] = None
+    # content type -> srcset одного формату (за Accept), напр. {"image/webp": "<url> 128w, <url> 256w"}
+    thumbnail_srcset: Dict[str, str] = {}
     preview_url: Optional[str] = None
+    # бінарна огинаюча аудіо: 20-байтний заголовок "O4LW" + пари (min, max) int8
+    waveform_url: Optional[str] = None
     file_url: Optional[str] = None
+    variants_status: str = "ready"  # pending | ready | failed
 
     viewer_status: str  # статус глядача: not_logged_in, logged_in, author, owner
 
 
 class SignedUrlResponse(BaseModel):
-    url: str
\ No newline at end of file
+    url: str
+
+
+class NearDuplicateResponse(BaseModel):
+    file_id: str
+    distance: int  # відстань Хеммінга між dHash
+
+
+class UploadCreateRequest(BaseModel):
+    meta: FileUploadRequest
+    size: conint(gt=0)  # повна довжина файлу в байтах (Upload-Length)
+    content_type: Optional[str] = None
+
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    offset: int  # скільки байтів уже прийнято; наступний PATCH починається звідси
+    size: int
+    chunk_size: int  # PATCH-і кратні цьому розміру не втрачають жодного байта
+    status: str  # active | completing | done
+    expires_at: _dt.datetime
+    file_id: Optional[str] = None  # з'являється після фіналізації
@@ -12,6 +12,13 @@ class BalanceResponse(BaseModel):
     balance: int
 
 
+class CommissionSummaryResponse(BaseModel):
+    pending: int        # у журналі, ще не на балансі
+    pending_sales: int
+    settled: int
+    settled_sales: int
+
+
 class TransactionPublic(BaseModel):
     id: str
     amount: int
@@ -0,0 +1,323 @@
+"""
+Бенчмарк генерації варіантів (PreviewService) на синтетичних фікстурах.
+
+    python -m app.services.bench_variants run --out bench.json [--quick] [--only image,pdf,audio,video]
+    python -m app.services.bench_variants run --out bench.json --baseline baseline.json
+    python -m app.services.bench_variants compare bench.json baseline.json
+
+Кожен кейс виконується в окремому процесі, тож пікова RSS (ru_maxrss) не
+змішується між кейсами. Фікстури генеруються один раз і кешуються в --fixtures.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import shutil
+import subprocess
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import PIL
+from PIL import Image
+import soundfile as sf
+
+try:
+    import fitz  # PyMuPDF
+    HAS_PYMUPDF = True
+except ImportError:
+    HAS_PYMUPDF = False
+
+# розміри фікстур; --quick бере лише перші два кожного виду
+IMAGE_MEGAPIXELS = (0.1, 1, 12, 50)
+PDF_PAGES = (1, 20, 100, 500)
+AUDIO_SECONDS = (5, 60, 600, 7200)
+VIDEO_SECONDS = (10, 60, 600)
+
+AUDIO_SAMPLE_RATE = 44100
+# шляхи PreviewService: з диска (як у воркері) і з байтів у пам'яті
+MODES = ("path", "bytes")
+
+DEFAULT_FIXTURES_DIR = Path(tempfile.gettempdir()) / "one4lib-bench-fixtures"
+DEFAULT_THRESHOLD = 0.15
+# абсолютні пороги, нижче яких різниця вважається шумом
+MIN_WALL_DELTA_S = 0.02
+MIN_RSS_DELTA_MB = 8
+
+
+class Case(NamedTuple):
+    kind: str
+    label: str
+    file_type: str
+    filename: str
+    size: float
+
+    @property
+    def id(self) -> str:
+        return f"{self.kind}-{self.label}"
+
+
+def all_cases(quick: bool = False) -> list[Case]:
+    n = 2 if quick else None
+    cases = [
+        Case("image", f"{mp:g}mp", _KIND_TYPES["image"], f"image-{mp:g}mp.jpg", mp)
+        for mp in IMAGE_MEGAPIXELS[:n]
+    ]
+    if HAS_PYMUPDF:
+        cases += [
+            Case("pdf", f"{pages}p", _KIND_TYPES["pdf"], f"doc-{pages}p.pdf", pages)
+            for pages in PDF_PAGES[:n]
+        ]
+    cases += [
+        Case("audio", f"{sec}s", _KIND_TYPES["audio"], f"audio-{sec}s.flac", sec)
+        for sec in AUDIO_SECONDS[:n]
+    ]
+    if shutil.which("ffmpeg"):
+        cases += [
+            Case("video", f"{sec}s", _KIND_TYPES["video"], f"video-{sec}s.mp4", sec)
+            for sec in VIDEO_SECONDS[:n]
+        ]
+    return cases
+
+
+# --- синтетичні фікстури ---
+
+def _make_image(path: Path, megapixels: float) -> None:
+    # 3:2, плавний градієнт + шум: JPEG стискається як фото, а не як заливка
+    h = max(1, int((megapixels * 1_000_000 / 1.5) ** 0.5))
+    w = int(h * 1.5)
+    rng = np.random.default_rng(int(megapixels * 1000))
+    img = np.empty((h, w, 3), dtype=np.uint8)
+    xs = np.linspace(0, 255, w, dtype=np.float32)
+    for y0 in range(0, h, 512):
+        rows = min(512, h - y0)
+        ys = np.linspace(y0, y0 + rows - 1, rows, dtype=np.float32)[:, None] * (255 / h)
+        noise = rng.normal(0, 12, (rows, w)).astype(np.float32)
+        img[y0:y0 + rows, :, 0] = np.clip(xs + noise, 0, 255)
+        img[y0:y0 + rows, :, 1] = np.clip(ys + noise, 0, 255)
+        img[y0:y0 + rows, :, 2] = np.clip((xs + ys) / 2 - noise, 0, 255)
+    Image.fromarray(img).save(path, format="JPEG", quality=90)
+
+
+def _make_pdf(path: Path, pages: int) -> None:
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4
+        page.insert_text((72, 72), f"Synthetic page {i + 1} of {pages}", fontsize=18)
+        body = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 3
+        for line in range(40):
+            page.insert_text((72, 110 + line * 17), body[line % 20:line % 20 + 80], fontsize=10)
+        page.draw_rect(fitz.Rect(72, 800 - (i % 5) * 20, 300, 820), color=(0.2, 0.4, 0.8), fill=(0.8, 0.9, 1))
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+def _make_audio(path: Path, seconds: int) -> None:
+    # пишемо блоками по хвилині, щоб 2 години не займали гігабайти пам'яті
+    rng = np.random.default_rng(seconds)
+    sr = AUDIO_SAMPLE_RATE
+    block = sr * 60
+    total = seconds * sr
+    with sf.SoundFile(path, "w", samplerate=sr, channels=2, format="FLAC") as f:
+        for start in range(0, total, block):
+            t = np.arange(start, min(start + block, total), dtype=np.float32) / sr
+            tone = 0.3 * np.sin(2 * np.pi * (220 + 20 * np.sin(t / 7)) * t)
+            noise = rng.normal(0, 0.01, t.shape).astype(np.float32)
+            f.write(np.stack([tone + noise, tone - noise], axis=1))
+
+
+def _make_video(path: Path, seconds: int) -> None:
+    # 1080p30 тестова таблиця + тон, ключовий кадр кожні 2 с — як у типового завантаження
+    subprocess.run([
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", "testsrc2=size=1920x1080:rate=30",
+        "-f", "lavfi", "-i", "sine=frequency=440",
+        "-t", str(seconds), "-c:v", "libx264", "-preset", "ultrafast", "-g", "60",
+        "-c:a", "aac", "-f", "mp4", str(path),
+    ], check=True)
+
+
+_MAKERS = {"image": _make_image, "pdf": _make_pdf, "audio": _make_audio, "video": _make_video}
+_KIND_TYPES = {"image": "image/jpeg", "pdf": "application/pdf", "audio": "audio/flac", "video": "video/mp4"}
+_WARMUP_SIZES = {"image": 0.01, "pdf": 1, "audio": 1, "video": 1}
+
+
+def ensure_fixture(case: Case, root: Path) -> Path:
+    path = root / case.filename
+    if not path.exists():
+        root.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}")
+        _MAKERS[case.kind](tmp, case.size)
+        tmp.rename(path)
+    return path
+
+
+# --- вимірювання ---
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss у KiB на Linux і в байтах на macOS; враховуємо і дочірні процеси (рендер PDF)
+    scale = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * scale
+
+
+def _warmup(file_type: str) -> None:
+    """
+    Прогін на крихітному вході того ж типу: лінивий імпорт і JIT (librosa/resampler,
+    кодеки Pillow) оплачуються воркером один раз, тож у замір вони не йдуть.
+    """
+    from app.services.preview import PreviewService
+
+    with tempfile.TemporaryDirectory() as tmp:
+        kind = next(k for k, t in _KIND_TYPES.items() if t == file_type)
+        path = Path(tmp) / f"warmup.{file_type.split('/')[1]}"
+        _MAKERS[kind](path, _WARMUP_SIZES[kind])
+        PreviewService.generate_variants_from_path(str(path), file_type)
+
+
+def _measure(path: str, file_type: str, mode: str, render_processes: int, warmup: bool) -> dict:
+    """Виконується в окремому процесі: один виклик PreviewService, повертає метрики."""
+    from app.services.preview import PreviewService
+
+    if warmup:
+        _warmup(file_type)
+    start = time.perf_counter()
+    if mode == "path":
+        variants = PreviewService.generate_variants_from_path(path, file_type, render_processes)
+    else:
+        with open(path, "rb") as f:
+            data = f.read()
+        variants = PreviewService.generate_variants(data, file_type)
+    wall = time.perf_counter() - start
+
+    output = len(variants.thumbnail or b"") + len(variants.preview or b"") + len(variants.waveform or b"")
+    output += sum(len(data) for data, _ in variants.renditions.values())
+    return {"wall_s": wall, "peak_rss_mb": _peak_rss_mb(), "output_bytes": output}
+
+
+def run(
+        cases: list[Case],
+        fixtures: Path,
+        repeat: int = 3,
+        modes: tuple[str, ...] = MODES,
+        render_processes: int = 1,
+        warmup: bool = True,
+) -> dict:
+    results = {}
+    # spawn + один виклик на процес: чиста пікова RSS і без кешів попереднього кейсу
+    ctx = multiprocessing.get_context("spawn")
+    for case in cases:
+        path = ensure_fixture(case, fixtures)
+        for mode in modes:
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    runs.append(pool.submit(_measure, str(path), case.file_type, mode, render_processes, warmup).result())
+            key = f"{case.id}:{mode}"
+            results[key] = {
+                "wall_s": statistics.median(r["wall_s"] for r in runs),
+                "wall_s_all": [round(r["wall_s"], 4) for r in runs],
+                "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+                "output_bytes": runs[-1]["output_bytes"],
+                "input_bytes": path.stat().st_size,
+            }
+            r = results[key]
+            print(f"{key:<24} {r['wall_s']:8.3f}s {r['peak_rss_mb']:8.1f} MB {r['output_bytes']:>12,} B", flush=True)
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": multiprocessing.cpu_count(),
+            "pillow": PIL.__version__,
+            "numpy": np.__version__,
+            "repeat": repeat,
+            "render_processes": render_processes,
+            "warmup": warmup,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """Повертає список регресій (порожній, якщо все в межах порогу)."""
+    regressions = []
+    cur, base = current["results"], baseline["results"]
+    for key in sorted(cur.keys() & base.keys()):
+        c, b = cur[key], base[key]
+        checks = (
+            ("wall_s", MIN_WALL_DELTA_S, "{:.3f}s"),
+            ("peak_rss_mb", MIN_RSS_DELTA_MB, "{:.1f} MB"),
+            ("output_bytes", 0, "{:,} B"),
+        )
+        for metric, min_delta, fmt in checks:
+            old, new = b[metric], c[metric]
+            if new > old * (1 + threshold) and new - old > min_delta:
+                change = (new / old - 1) * 100 if old else float("inf")
+                regressions.append(
+                    f"{key} {metric}: {fmt.format(old)} -> {fmt.format(new)} (+{change:.0f}%)"
+                )
+    for key in sorted(base.keys() - cur.keys()):
+        print(f"[WARN] {key} missing from current run")
+    return regressions
+
+
+def _report(regressions: list[str]) -> int:
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="run the benchmark and write JSON results")
+    p_run.add_argument("--out", type=Path, required=True)
+    p_run.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES_DIR)
+    p_run.add_argument("--quick", action="store_true", help="only the two smallest fixtures of each kind")
+    p_run.add_argument("--only", help="comma-separated kinds (image,pdf,audio,video) or case ids")
+    p_run.add_argument("--modes", default=",".join(MODES))
+    p_run.add_argument("--repeat", type=int, default=3)
+    p_run.add_argument("--render-processes", type=int, default=1)
+    p_run.add_argument("--cold", action="store_true", help="skip the warm-up call (include import/JIT cost)")
+    p_run.add_argument("--baseline", type=Path, help="compare against this file after the run")
+    p_run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    p_cmp = sub.add_parser("compare", help="compare two result files")
+    p_cmp.add_argument("current", type=Path)
+    p_cmp.add_argument("baseline", type=Path)
+    p_cmp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        current = json.loads(args.current.read_text())
+        baseline = json.loads(args.baseline.read_text())
+        return _report(compare(current, baseline, args.threshold))
+
+    cases = all_cases(args.quick)
+    if args.only:
+        wanted = set(args.only.split(","))
+        cases = [c for c in cases if c.kind in wanted or c.id in wanted]
+    modes = tuple(m for m in args.modes.split(",") if m in MODES)
+    results = run(cases, args.fixtures, args.repeat, modes, args.render_processes, not args.cold)
+    args.out.write_text(json.dumps(results, indent=2))
+    print(f"Results saved: {args.out}")
+    if args.baseline:
+        return _report(compare(results, json.loads(args.baseline.read_text()), args.threshold))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
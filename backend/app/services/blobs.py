@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+from pymongo import ReturnDocument
+from app.core.storage import delete_object
+from app.models.blobs import BlobVariants, ContentBlob
+
+
+class BlobService:
+    """Content-addressed зберігання оригіналів і їхніх варіантів з підрахунком посилань."""
+
+    @staticmethod
+    async def acquire(sha256: str, key: str, size: int, content_type: Optional[str]) -> ContentBlob:
+        """
+        Реєструє щойно завантажений об'єкт `key` з хешем `sha256` і бере на нього посилання.
+        Якщо такий вміст уже є — зайвий об'єкт видаляється, а повертається існуючий blob.
+        """
+        raw = await ContentBlob.get_motor_collection().find_one_and_update(
+            {"sha256": sha256},
+            {
+                "$inc": {"ref_count": 1},
+                "$setOnInsert": {
+                    "key": key,
+                    "size": size,
+                    "content_type": content_type,
+                    "variants": [],
+                    "created_at": datetime.now(timezone.utc),
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        blob = ContentBlob.model_validate(raw)
+        if blob.key != key:
+            await delete_object(key)
+        return blob
+
+    @staticmethod
+    def find_variants(blob: ContentBlob, file_type: str) -> Optional[BlobVariants]:
+        return next((v for v in blob.variants if v.file_type == file_type), None)
+
+    @staticmethod
+    async def get_variants(sha256: str, file_type: str) -> Optional[BlobVariants]:
+        blob = await ContentBlob.find_one({"sha256": sha256})
+        return BlobService.find_variants(blob, file_type) if blob else None
+
+    @staticmethod
+    async def record_variants(sha256: str, variants: BlobVariants) -> bool:
+        """
+        Запам'ятовує варіанти для (вмісту, file_type). Повертає False, якщо їх уже
+        записала інша задача — тоді свої щойно завантажені варіанти слід прибрати.
+        """
+        res = await ContentBlob.get_motor_collection().update_one(
+            {"sha256": sha256, "variants.file_type": {"$ne": variants.file_type}},
+            {"$push": {"variants": variants.model_dump()}},
+        )
+        return res.modified_count == 1
+
+    @staticmethod
+    async def replace_variants(sha256: str, variants: BlobVariants) -> None:
+        """Замінює варіанти для (вмісту, file_type) новими (регенерація); старі об'єкти прибирає викликач."""
+        res = await ContentBlob.get_motor_collection().update_one(
+            {"sha256": sha256, "variants.file_type": variants.file_type},
+            {"$set": {"variants.$": variants.model_dump()}},
+        )
+        if not res.matched_count:
+            await BlobService.record_variants(sha256, variants)
+
+    @staticmethod
+    async def release(sha256: str, purge: bool = True) -> None:
+        """
+        Знімає посилання; коли їх не лишилось — видаляє оригінал і всі варіанти з S3.
+        purge=False лишає blob з нульовим лічильником: байти ще можуть знадобитися
+        для повторної реєстрації, остаточно їх прибирає discard().
+        """
+        raw = await ContentBlob.get_motor_collection().find_one_and_update(
+            {"sha256": sha256},
+            {"$inc": {"ref_count": -1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not raw or raw["ref_count"] > 0 or not purge:
+            return
+        await BlobService._purge(ContentBlob.model_validate(raw))
+
+    @staticmethod
+    async def discard(key: str) -> None:
+        """
+        Прибирає завантажений об'єкт, з якого так і не з'явився File. Об'єкт, на який
+        посилається blob із живими посиланнями, не чіпається.
+        """
+        blob = await ContentBlob.find_one({"key": key})
+        if blob is None:
+            await delete_object(key)
+        elif blob.ref_count <= 0:
+            await BlobService._purge(blob)
+
+    @staticmethod
+    async def _purge(blob: ContentBlob) -> None:
+        # між перевіркою і видаленням на вміст могли знову послатися — тоді нічого не робимо
+        deleted = await ContentBlob.get_motor_collection().delete_one({"_id": blob.id, "ref_count": {"$lte": 0}})
+        if not deleted.deleted_count:
+            return
+        keys = {blob.key}
+        for v in blob.variants:
+            keys.update(k for k in (v.thumbnail_key, v.preview_key, v.waveform_key) if k)
+            keys.update(v.thumbnail_variants.values())
+        await asyncio.gather(*(delete_object(k) for k in keys))
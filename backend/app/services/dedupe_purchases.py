@@ -0,0 +1,72 @@
+"""
+Одноразове прибирання повторних покупок перед побудовою унікального
+індексу (user_id, file_id) на file_purchase_transactions.
+
+    python -m app.services.dedupe_purchases [--apply]
+
+Для кожної пари (user_id, file_id) лишається найраніша покупка; за кожен
+повтор покупцеві повертаються списані поінти, а purchase_count файлу
+зменшується. Комісію автора не відкликаємо. Без --apply лише звіт.
+Працює напряму з колекціями, без init_beanie: той створив би індекс
+і впав на дублікатах.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+
+log = logging.getLogger(__name__)
+
+
+async def dedupe(db, apply: bool) -> tuple[int, int]:
+    """Повертає (кількість повторів, сума поінтів до повернення)."""
+    purchases = db["file_purchase_transactions"]
+    groups = purchases.aggregate([
+        {"$sort": {"created_at": 1, "_id": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "file_id": "$file_id"},
+            "txs": {"$push": {"_id": "$_id", "points_spent": "$points_spent", "settled": "$settled"}},
+            "n": {"$sum": 1},
+        }},
+        {"$match": {"n": {"$gt": 1}}},
+    ], allowDiskUse=True)
+
+    duplicates = refunded = 0
+    async for group in groups:
+        user_id, file_id = group["_id"]["user_id"], group["_id"]["file_id"]
+        extra = group["txs"][1:]
+        refund = sum(tx["points_spent"] for tx in extra)
+        # legacy-записи без поля settled уже враховані в purchase_count
+        counted = sum(1 for tx in extra if tx.get("settled", True))
+        duplicates += len(extra)
+        refunded += refund
+        log.info("user %s file %s: %d duplicate(s), refund %d", user_id, file_id, len(extra), refund)
+        if not apply:
+            continue
+        await purchases.delete_many({"_id": {"$in": [tx["_id"] for tx in extra]}})
+        await db["users"].update_one({"_id": user_id}, {"$inc": {"points": refund}})
+        if counted:
+            await db["files"].update_one({"_id": file_id}, {"$inc": {"purchase_count": -counted}})
+    return duplicates, refunded
+
+
+async def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="delete duplicates and refund buyers")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    client = AsyncIOMotorClient(settings.mongo_uri, tz_aware=True)
+    try:
+        duplicates, refunded = await dedupe(client.get_default_database(), args.apply)
+    finally:
+        client.close()
+    log.info("%s %d duplicate purchases, %d points refunded",
+             "removed" if args.apply else "found", duplicates, refunded)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,65 +1,273 @@
-
-from datetime import datetime
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 from beanie import PydanticObjectId
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.core.config import settings
+from app.core.database import idempotent_inc, run_in_transaction, supports_transactions
+from app.core.ownership import owned_files
 from app.models.files import File
 from app.models.file_purchase import FilePurchaseTransaction
 from app.models.account import User
+from app.schemas.file_purchase import CartPurchaseResponse
 from fastapi import HTTPException, status
 from app.services.points import PointsService
 
+log = logging.getLogger(__name__)
+
+
+class AlreadyPurchased(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_409_CONFLICT, detail="File already purchased")
+
 
 class FilePurchaseService:
-    """Бізнес-логіка для покупки файлів за поінти"""
+    """
+    Бізнес-логіка для покупки файлів за поінти.
+
+    Покупка — це транзакція лише над документами покупця: умовне списання
+    (points >= price) і запис FilePurchaseTransaction, який водночас є записом
+    журналу комісій. Лічильник покупок файлу і баланс автора — "гарячі" документи,
+    спільні для всіх покупців; їх оновлює фоновий flusher раз на
+    commission_flush_interval секунд, агрегуючи всі нові записи журналу.
+    Flush ідемпотентний і без replica set: пачку, обірвану падінням процесу,
+    безпечно доводить будь-який наступний flush.
+    """
+
+    _flusher: Optional[asyncio.Task] = None
+
+    @staticmethod
+    async def _debit(uid: PydanticObjectId, amount: int, session: Optional[AsyncIOMotorClientSession]) -> None:
+        # Перевірка балансу і списання — одна атомарна операція,
+        # між ними немає вікна для паралельної покупки
+        debited = await User.get_motor_collection().find_one_and_update(
+            {"_id": uid, "points": {"$gte": amount}},
+            {"$inc": {"points": -amount}},
+            projection={"_id": 1},
+            session=session,
+        )
+        if debited is None:
+            if not await User.get_motor_collection().count_documents({"_id": uid}, session=session):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found"
+                )
+            raise HTTPException(
+                status_code=status.HTTP_402_PAYMENT_REQUIRED,
+                detail="Insufficient points. Please top up your balance."
+            )
+
+    @staticmethod
+    def _new_tx(uid: PydanticObjectId, f: dict) -> FilePurchaseTransaction:
+        return FilePurchaseTransaction(
+            points_spent=f["price"],
+            user_id=uid,
+            file_id=f["_id"],
+            author_id=f.get("author_id"),
+            commission=PointsService.commission_for(f["price"]),
+            settled=False,
+        )
 
     @staticmethod
     async def purchase_file(user_id: str, file_id: str) -> None:
         uid = PydanticObjectId(user_id)
         fid = PydanticObjectId(file_id)
+        if await owned_files.owns(uid, fid):
+            raise AlreadyPurchased()
 
-        # 1) Перевірка існування файлу
-        f = await File.get(fid)
+        # 1) Ціна і автор файлу — одним запитом з проєкцією
+        f = await File.get_motor_collection().find_one(
+            {"_id": fid}, projection={"price": 1, "author_id": 1},
+        )
         if not f:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="File not found"
             )
+        tx = FilePurchaseService._new_tx(uid, f)
 
-        # 2) Перевірка існування юзера
-        u = await User.get(uid)
-        if not u:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
+        async def _purchase(session: Optional[AsyncIOMotorClientSession]) -> None:
+            # 2) Списання
+            await FilePurchaseService._debit(uid, tx.points_spent, session)
+            # 3) Запис транзакції (outbox)
+            try:
+                await tx.insert(session=session)
+            except Exception:
+                if session is None:
+                    # без replica set відкату немає — повертаємо списане вручну
+                    await User.get_motor_collection().update_one({"_id": uid}, {"$inc": {"points": tx.points_spent}})
+                raise
 
-        # 3) Перевірка балансу
-        if f.price > u.points:
+        try:
+            await run_in_transaction(_purchase)
+        except DuplicateKeyError:
+            # покупка з іншого процесу або паралельний запит: унікальний індекс
+            # (user_id, file_id) обриває транзакцію, і списання відкочується
+            owned_files.invalidate(uid)
+            raise AlreadyPurchased()
+        owned_files.invalidate(uid)
+
+    @staticmethod
+    async def purchase_cart(user_id: str, file_ids: list[str]) -> CartPurchaseResponse:
+        """
+        Купівля кількох файлів одним списанням. Уже куплені файли пропускаються;
+        решта купується разом або не купується зовсім.
+        """
+        uid = PydanticObjectId(user_id)
+        fids = list(dict.fromkeys(PydanticObjectId(fid) for fid in file_ids))
+
+        # 1) Ціни й автори всіх файлів — один $in-запит
+        files = {
+            f["_id"]: f for f in await File.get_motor_collection().find(
+                {"_id": {"$in": fids}}, projection={"price": 1, "author_id": 1},
+            ).to_list(None)
+        }
+        missing = [str(fid) for fid in fids if fid not in files]
+        if missing:
             raise HTTPException(
-                status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                detail="Insufficient points. Please top up your balance."
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Files not found: {', '.join(missing)}"
             )
 
-        # 4) Списання поінтів
-        await u.update({'$inc': {'points': -f.price}})
+        async def _checkout(session: Optional[AsyncIOMotorClientSession]) -> tuple[list, set]:
+            # 2) Що з кошика вже куплено — читається в тій самій транзакції, а не з кешу
+            owned = {
+                raw["file_id"] async for raw in FilePurchaseTransaction.get_motor_collection().find(
+                    {"user_id": uid, "file_id": {"$in": fids}}, projection={"_id": 0, "file_id": 1},
+                    session=session,
+                )
+            }
+            txs = [FilePurchaseService._new_tx(uid, files[fid]) for fid in fids if fid not in owned]
+            if not txs:
+                return txs, owned
+            total = sum(tx.points_spent for tx in txs)
+            # 3) Одне списання на весь кошик
+            await FilePurchaseService._debit(uid, total, session)
+            # 4) Усі записи покупок — одним insert_many
+            try:
+                await FilePurchaseTransaction.insert_many(txs, session=session)
+            except Exception:
+                if session is None:
+                    await FilePurchaseTransaction.get_motor_collection().delete_many(
+                        {"_id": {"$in": [tx.id for tx in txs]}}
+                    )
+                    await User.get_motor_collection().update_one({"_id": uid}, {"$inc": {"points": total}})
+                raise
+            return txs, owned
 
-        # 5) Інкремент лічильника покупок
-        await f.update({'$inc': {'purchase_count': 1}})
+        try:
+            txs, owned = await run_in_transaction(_checkout)
+        except BulkWriteError as e:
+            if not any(err.get("code") == 11000 for err in e.details.get("writeErrors", [])):
+                raise
+            # паралельна покупка одного з файлів — кошик відкочено повністю
+            owned_files.invalidate(uid)
+            raise AlreadyPurchased()
+        if txs:
+            owned_files.invalidate(uid)
+        return CartPurchaseResponse(
+            purchased=[str(tx.file_id) for tx in txs],
+            skipped=[str(fid) for fid in fids if fid in owned],
+            points_spent=sum(tx.points_spent for tx in txs),
+        )
 
-        # 6) Запис транзакції
-        tx = FilePurchaseTransaction(
-            created_at=datetime.utcnow(),
-            points_spent=f.price,
-            user_id=uid,
-            file_id=fid,
+    @staticmethod
+    async def _claim(limit: int) -> tuple[Optional[ObjectId], list[FilePurchaseTransaction]]:
+        """
+        Позначає пачку записів журналу токеном flush-а і повертає (токен, записи).
+        Спершу доводяться пачки, чий flusher помер посередині (lease прострочено), — з їхнім
+        же токеном, тож уже застосовані інкременти не повторяться. Інакше береться
+        до `limit` найстаріших ще не взятих записів.
+        """
+        coll = FilePurchaseTransaction.get_motor_collection()
+        now = datetime.now(timezone.utc)
+        until = now + timedelta(seconds=settings.commission_flush_lease)
+        stale = await coll.find_one(
+            {"settled": False, "flush_token": {"$ne": None}, "flush_until": {"$lt": now}},
+            projection={"flush_token": 1},
         )
-        await tx.insert()
+        if stale:
+            token = stale["flush_token"]
+            await coll.update_many(
+                {"settled": False, "flush_token": token}, {"$set": {"flush_until": until}},
+            )
+        else:
+            token = ObjectId()
+            ids = [
+                raw["_id"] async for raw in coll.find(
+                    {"settled": False, "flush_token": None}, projection={"_id": 1},
+                ).sort("created_at", 1).limit(limit)
+            ]
+            if not ids:
+                return None, []
+            # паралельний flusher міг узяти частину тих самих записів — кожен отримає свої
+            await coll.update_many(
+                {"_id": {"$in": ids}, "settled": False, "flush_token": None},
+                {"$set": {"flush_token": token, "flush_until": until}},
+            )
+        raws = await coll.find({"settled": False, "flush_token": token}).to_list(None)
+        return token, [FilePurchaseTransaction.model_validate(raw) for raw in raws]
 
-        # 7) Нарахування авторської комісії
-        await PointsService.distribute_commission(
-            author_id=str(f.author_id),
-            file_id=file_id,
-            total_price=f.price
+    @staticmethod
+    async def flush(limit: Optional[int] = None) -> int:
+        """
+        Застосовує пачку записів журналу: сумарний $inc purchase_count на файл і комісії
+        на автора, по одному bulk_write. Записи позначаються settled лише після того,
+        як усі інкременти застосовано; якщо процес упаде раніше, пачку з тим самим
+        токеном доведе наступний flush, а idempotent_inc не дасть задвоїти вже
+        зроблене. Транзакції (replica set) для цього не потрібні.
+        Повертає кількість застосованих записів.
+        """
+        token, txs = await FilePurchaseService._claim(limit or settings.commission_flush_batch)
+        if not txs:
+            return 0
+        sold = Counter(tx.file_id for tx in txs)
+        await File.get_motor_collection().bulk_write(
+            [idempotent_inc(fid, {"purchase_count": n}, token) for fid, n in sold.items()],
+            ordered=False,
+        )
+        await PointsService.distribute_commissions(
+            [(tx.id, tx.author_id, tx.file_id, tx.commission) for tx in txs if tx.author_id],
+            token,
         )
+        await FilePurchaseTransaction.get_motor_collection().update_many(
+            {"settled": False, "flush_token": token},
+            {"$set": {"settled": True, "settled_at": datetime.now(timezone.utc)}},
+        )
+        return len(txs)
+
+    @staticmethod
+    async def _flush_loop() -> None:
+        while True:
+            try:
+                n = await FilePurchaseService.flush()
+            except Exception:
+                log.exception("commission ledger flush failed")
+                n = 0
+            # повна пачка — журнал відстає, наступну беремо без паузи
+            if n < settings.commission_flush_batch:
+                await asyncio.sleep(settings.commission_flush_interval)
+
+    @staticmethod
+    async def start() -> None:
+        await supports_transactions()
+        FilePurchaseService._flusher = asyncio.create_task(FilePurchaseService._flush_loop())
+
+    @staticmethod
+    async def stop() -> None:
+        if FilePurchaseService._flusher is not None:
+            FilePurchaseService._flusher.cancel()
+            await asyncio.gather(FilePurchaseService._flusher, return_exceptions=True)
+            FilePurchaseService._flusher = None
+        # останній прохід, щоб свіжі покупки не чекали наступного запуску
+        try:
+            await FilePurchaseService.flush()
+        except Exception:
+            log.exception("final commission ledger flush failed")
 
     @staticmethod
     async def get_all_user_transactions(user_id: str) -> list[FilePurchaseTransaction]:
@@ -70,5 +278,4 @@ class FilePurchaseService:
 
     @staticmethod
     async def get_bought_files(user_id: str) -> list[str]:
-        txs = await FilePurchaseService.get_all_user_transactions(user_id)
-        return [str(tx.file_id) for tx in txs]
+        return [str(fid) for fid in await owned_files.get(user_id)]
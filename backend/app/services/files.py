@@ -1,94 +1,193 @@
+import hashlib
 from typing import List, Optional
 from beanie import PydanticObjectId
+from bson import ObjectId
 from fastapi import HTTPException, status
-from io import BytesIO
-from app.core.storage import create_signed_url, upload_fileobj
-from app.models.file_purchase import FilePurchaseTransaction
+from app.core.admission import admission, estimate_cost
+from app.core.config import settings
+from app.core.loaders import Loaders
+from app.core.pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT, encode_cursor, keyset_query
+from app.core.storage import create_signed_url, upload_stream
 from app.models.files import File
+from app.models.preview_jobs import PreviewJob
+from app.services.blobs import BlobService
+from app.services.near_duplicates import NearDuplicateService
 from app.services.points import PointsService
-from app.services.preview import PreviewService
+from app.services.preview_jobs import PreviewJobService
 from app.schemas.files import FileUploadRequest, FileResponse
-from app.models.account import User
 import asyncio
 
+_THUMBNAIL_MIME = {"avif": "image/avif", "webp": "image/webp", "jpg": "image/jpeg"}
+
+
 class FileService:
 
     @staticmethod
     async def upload(author_id: str, meta: FileUploadRequest, file) -> str:
-        data = await file.read()
-        thumb_bytes, prev_bytes = PreviewService.generate_variants(data, meta.file_type)
+        content_type = file.content_type or "application/octet-stream"
+        # SHA-256 рахується на льоту, поки chunk-и йдуть у S3
+        hasher = hashlib.sha256()
+        size = 0
 
-        async def _upl(data_bytes, content_type):
-            return upload_fileobj(BytesIO(data_bytes), content_type)
+        async def _read(n: int) -> bytes:
+            nonlocal size
+            chunk = await file.read(n)
+            hasher.update(chunk)
+            size += len(chunk)
+            return chunk
 
-        preview_content_type = file.content_type or meta.file_type
+        # черга генерації для цього виду переповнена — 503 до запису в S3 (тіло запиту
+        # на цей момент уже прийняте); резерв тримається, доки задача не з'явиться в черзі
+        async with admission.admit(meta.file_type, file.size or 0):
+            # зберігаємо лише оригінал (потоково, multipart); thumbnail/preview згенерує фоновий воркер
+            uploaded_key = await upload_stream(_read, content_type)
+            try:
+                return await FileService.register(
+                    author_id, meta, uploaded_key, hasher.hexdigest(), size,
+                    content_type, file.content_type or meta.file_type,
+                )
+            except Exception:
+                await BlobService.discard(uploaded_key)
+                raise
 
-        original_key, thumbnail_key, preview_key = await asyncio.gather(
-            _upl(data, file.content_type),
-            _upl(thumb_bytes, "image/png") if thumb_bytes else None,
-            _upl(prev_bytes, preview_content_type) if prev_bytes else None,
-        )
+    @staticmethod
+    async def register(
+            author_id: str,
+            meta: FileUploadRequest,
+            uploaded_key: str,
+            sha256: str,
+            size: int,
+            content_type: str,
+            preview_content_type: Optional[str] = None,
+    ) -> str:
+        """
+        Створює File для вже завантаженого в S3 оригіналу (звичайний або chunked upload).
+        Якщо реєстрація обірвалась, усе зроблене відкочується, а посилання на вміст
+        знімається без видалення байтів: викликач або повторює register, або робить
+        BlobService.discard(uploaded_key).
+        """
+        # однаковий вміст уже є — дублікат видаляється, File посилається на існуючий об'єкт
+        blob = await BlobService.acquire(sha256, uploaded_key, size, content_type)
+        known = BlobService.find_variants(blob, meta.file_type)
 
-        # 5) зберігаємо всі ключі
         doc = File(
             author_id=PydanticObjectId(author_id),
-            file_key=original_key,
-            thumbnail_key=thumbnail_key,
-            preview_key=preview_key,
+            file_key=blob.key,
+            content_sha256=blob.sha256,
+            variants_status="ready" if known else "pending",
+            thumbnail_key=known.thumbnail_key if known else None,
+            preview_key=known.preview_key if known else None,
+            thumbnail_variants=known.thumbnail_variants if known else {},
+            waveform_key=known.waveform_key if known else None,
             file_type=meta.file_type,
             title=meta.title,
             description=meta.description or "",
             tags=meta.tags,
             price=meta.price,
         )
-        await doc.insert()
+        try:
+            await doc.insert()
+
+            if known and known.phash:
+                await NearDuplicateService.register(doc, known.phash)
+            if not known:
+                await PreviewJobService.enqueue(
+                    doc.id, meta.file_type, preview_content_type or meta.file_type,
+                    estimate_cost(meta.file_type, size),
+                )
 
-        await PointsService.add_points_for_upload(author_id, str(doc.id))
+            await PointsService.add_points_for_upload(author_id, str(doc.id))
+        except Exception:
+            if known and known.phash:
+                NearDuplicateService.remove(doc.id, known.phash)
+            await PreviewJob.get_motor_collection().delete_many({"file_id": doc.id})
+            await File.get_motor_collection().delete_one({"_id": doc.id})
+            await BlobService.release(blob.sha256, purge=False)
+            raise
 
         return str(doc.id)
 
     @staticmethod
-    async def _is_purchased(uid: PydanticObjectId, fid: PydanticObjectId) -> bool:
-        tx = await FilePurchaseTransaction.find_one({
-            "user_id": uid,
-            "file_id": fid
-        })
-        return tx is not None
+    async def _build_srcset(variants: dict[str, str], accept: str = "") -> dict[str, str]:
+        """
+        {"256w.webp": key, ...} -> {"image/webp": "<url> 128w, <url> 256w"}.
+        Підписується лише один формат — найкомпактніший з тих, що є в Accept, інакше JPEG:
+        на сторінці каталогу це кілька підписів на файл замість усієї драбини.
+        """
+        by_type: dict[str, list[tuple[int, str]]] = {}
+        for name, key in variants.items():
+            width, ext = name.split(".", 1)
+            by_type.setdefault(_THUMBNAIL_MIME.get(ext, f"image/{ext}"), []).append(
+                (int(width.rstrip("w")), key)
+            )
+        mime = next(
+            (m for m in ("image/avif", "image/webp") if m in by_type and m in accept),
+            "image/jpeg" if "image/jpeg" in by_type else next(iter(by_type), None),
+        )
+        if mime is None:
+            return {}
+        items = sorted(by_type[mime])
+        urls = await asyncio.gather(*(create_signed_url(key) for _, key in items))
+        return {mime: ", ".join(f"{url} {w}w" for (w, _), url in zip(items, urls))}
+
+    @staticmethod
+    async def _original_url(doc: File) -> str:
+        # коротке посилання без кешу: те саме посилання не роздається іншим запитам
+        return await create_signed_url(doc.file_key, expires=settings.original_url_expires, cache=False)
 
     @staticmethod
     async def _build_response(
             doc: File,
             user_id: Optional[str],
-            detail: bool = False
+            detail: bool = False,
+            loaders: Optional[Loaders] = None,
+            accept: str = "",
     ) -> FileResponse:
-        # 1) визначаємо статус глядача
+        loaders = loaders or Loaders()
+
+        # 1) ставимо в чергу loader-ів автора і покупку ДО будь-якого іншого await:
+        # так усі відповіді сторінки потрапляють в один batch ($in) на той самий прохід loop-а
+        author_fut = loaders.users.load(doc.author_id)
+        purchased_fut = None
+        if user_id:
+            uid = PydanticObjectId(user_id)
+            if doc.author_id != uid:
+                purchased_fut = loaders.purchased(uid).load(doc.id)
+        author = await author_fut
+        purchased = await purchased_fut if purchased_fut is not None else False
+
+        # визначаємо статус глядача
         if not user_id:
             viewer_status = "not_logged_in"
+        elif purchased_fut is None:
+            viewer_status = "author"
+        elif purchased:
+            viewer_status = "owner"
         else:
-            uid = PydanticObjectId(user_id)
-            if doc.author_id == uid:
-                viewer_status = "author"
-            elif await FileService._is_purchased(uid, doc.id):
-                viewer_status = "owner"
-            else:
-                viewer_status = "logged_in"
+            viewer_status = "logged_in"
 
         # 2) генеруємо URL-и
         # thumbnail завжди
-        thumbnail_url = create_signed_url(doc.thumbnail_key) if doc.thumbnail_key else None
+        thumbnail_url = await create_signed_url(doc.thumbnail_key) if doc.thumbnail_key else None
+        thumbnail_srcset = await FileService._build_srcset(doc.thumbnail_variants, accept)
 
-        # preview тільки у деталях
+        # preview (і waveform для аудіо) тільки у деталях
         preview_url = None
+        waveform_url = None
         file_url = None
 
         if detail:
-            preview_url = create_signed_url(doc.preview_key) if doc.preview_key else None
+            if doc.preview_key == doc.file_key:
+                # preview без декодування — це сам оригінал, тож і посилання як на оригінал
+                preview_url = await FileService._original_url(doc)
+            elif doc.preview_key:
+                preview_url = await create_signed_url(doc.preview_key)
+            waveform_url = await create_signed_url(doc.waveform_key) if doc.waveform_key else None
             # оригінал — лише для автора або власника
             if viewer_status in ("author", "owner"):
-                file_url = create_signed_url(doc.file_key)
+                file_url = await FileService._original_url(doc)
 
         # 3) повертаємо FileResponse
-        author = await User.get(doc.author_id)
         username = author.username if author else "unknown"
 
         return FileResponse(
@@ -102,8 +201,11 @@ class FileService:
             purchase_count=doc.purchase_count,
             upload_date=doc.upload_date,
             thumbnail_url=thumbnail_url,
+            thumbnail_srcset=thumbnail_srcset,
             preview_url=preview_url,
+            waveform_url=waveform_url,
             file_url=file_url,
+            variants_status=doc.variants_status,
             viewer_status=viewer_status,
         )
 
@@ -112,31 +214,60 @@ class FileService:
             user_id: Optional[str],
             filters: Optional[List[str]] = None,
             file_types: Optional[List[str]] = None,  # <- було file_type: Optional[str]
-    ) -> List[FileResponse]:
+            loaders: Optional[Loaders] = None,
+            sort: str = "upload_date",
+            order: str = "desc",
+            limit: int = DEFAULT_PAGE_LIMIT,
+            cursor: Optional[str] = None,
+            accept: str = "",
+    ) -> tuple[List[FileResponse], Optional[str]]:
+        """Повертає (сторінку файлів, next_cursor або None, якщо це остання сторінка)."""
         query: dict = {}
         if filters:
             query["tags"] = {"$all": filters}
         if file_types:
             query["file_type"] = {"$in": file_types}
 
-        docs = await File.find(query).to_list()
-        return [
-            await FileService._build_response(doc, user_id, detail=False)
+        after, sort_spec = keyset_query(sort, order, cursor)
+        if after:
+            query = {"$and": [query, after]} if query else after
+
+        limit = max(1, min(limit, MAX_PAGE_LIMIT))
+        # +1 документ, щоб дізнатися, чи є наступна сторінка
+        docs = await File.find(query).sort(sort_spec).limit(limit + 1).to_list()
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            last = docs[-1]
+            next_cursor = encode_cursor(sort, order, getattr(last, sort), last.id)
+
+        # усі _build_response стартують в одному проході event loop,
+        # тож автори і покупки підтягуються двома $in-запитами
+        loaders = loaders or Loaders()
+        items = list(await asyncio.gather(*(
+            FileService._build_response(doc, user_id, detail=False, loaders=loaders, accept=accept)
             for doc in docs
-        ]
+        )))
+        return items, next_cursor
 
     @staticmethod
-    async def get_file_detail(
-            user_id: Optional[str],
-            file_id: str
-    ) -> FileResponse:
-        # перетворюємо в PydanticObjectId для Beanie
-        pid = PydanticObjectId(file_id)
-        doc = await File.get(pid)
+    async def get_file_doc(file_id: str) -> File:
+        # перетворюємо в PydanticObjectId для Beanie; некоректний id — 404, а не InvalidId (500)
+        doc = await File.get(PydanticObjectId(file_id)) if ObjectId.is_valid(file_id) else None
         if not doc:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="File not found"
             )
+        return doc
+
+    @staticmethod
+    async def get_file_detail(
+            user_id: Optional[str],
+            file_id: str,
+            loaders: Optional[Loaders] = None,
+            accept: str = "",
+    ) -> FileResponse:
+        doc = await FileService.get_file_doc(file_id)
         # у деталях detail=True
-        return await FileService._build_response(doc, user_id, detail=True)
+        return await FileService._build_response(doc, user_id, detail=True, loaders=loaders, accept=accept)
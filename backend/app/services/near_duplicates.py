@@ -0,0 +1,58 @@
+import logging
+from typing import Optional
+from beanie import PydanticObjectId
+from app.core.hash_index import MultiIndexHashTable
+from app.core.config import settings
+from app.models.files import File
+
+log = logging.getLogger(__name__)
+
+# Індекс perceptual hash усіх зображень у пам'яті процесу; будується з Mongo при старті
+_index: MultiIndexHashTable[PydanticObjectId] = MultiIndexHashTable()
+
+
+class NearDuplicateService:
+    """Пошук майже однакових зображень (перекодованих/зменшених) за dHash."""
+
+    @staticmethod
+    async def rebuild() -> None:
+        global _index
+        tree: MultiIndexHashTable[PydanticObjectId] = MultiIndexHashTable()
+        cursor = File.get_motor_collection().find(
+            {"phash": {"$ne": None}}, projection={"phash": 1}
+        )
+        async for raw in cursor:
+            tree.add(int(raw["phash"], 16), raw["_id"])
+        _index = tree
+        log.info("near-duplicate index rebuilt: %d images", len(tree))
+
+    @staticmethod
+    def add(file_id: PydanticObjectId, phash: str) -> None:
+        _index.add(int(phash, 16), file_id)
+
+    @staticmethod
+    def remove(file_id: PydanticObjectId, phash: str) -> None:
+        _index.remove(int(phash, 16), file_id)
+
+    @staticmethod
+    def find(
+            phash: str,
+            k: Optional[int] = None,
+            exclude: Optional[PydanticObjectId] = None,
+    ) -> list[tuple[PydanticObjectId, int]]:
+        """(file_id, відстань Хеммінга) усіх зображень в межах k, від найближчих."""
+        k = settings.near_duplicate_distance if k is None else k
+        found = [(fid, d) for fid, d in _index.query(int(phash, 16), k) if fid != exclude]
+        found.sort(key=lambda x: x[1])
+        return found
+
+    @staticmethod
+    async def register(doc: File, phash: str) -> list[PydanticObjectId]:
+        """Додає зображення в індекс і зберігає на документі знайдені майже-дублікати."""
+        if doc.phash and doc.phash != phash:
+            # зображення перегенероване з іншим хешем — старий запис більше не актуальний
+            _index.remove(int(doc.phash, 16), doc.id)
+        dups = [fid for fid, _ in NearDuplicateService.find(phash, exclude=doc.id)]
+        NearDuplicateService.add(doc.id, phash)
+        await doc.update({"$set": {"phash": phash, "near_duplicates": dups}})
+        return dups
@@ -1,9 +1,13 @@
 from fastapi import HTTPException, status
 from app.models.account import User
+from app.models.file_purchase import FilePurchaseTransaction
 from app.models.points import PointRewardTransaction, PointPurchaseTransaction
-from app.schemas.points import PurchaseRequest, TransactionPublic
-from datetime import datetime
+from app.schemas.points import CommissionSummaryResponse, PurchaseRequest, TransactionPublic
+from collections import Counter
 from beanie import PydanticObjectId
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from app.core.database import idempotent_inc, ignore_duplicates
 
 
 class PointsService:
@@ -28,40 +32,81 @@ class PointsService:
         await tx.insert()
 
     @classmethod
-    async def distribute_commission(
+    def commission_for(cls, total_price: int) -> int:
+        return (total_price * cls.BASE_COMMISSION_RATE) // 100
+
+    @classmethod
+    async def distribute_commissions(
             cls,
-            author_id: str,
-            file_id: str,
-            total_price: int,
+            credits: list[tuple[PydanticObjectId, PydanticObjectId, PydanticObjectId, int]],
+            token: ObjectId,
     ) -> None:
-        aid = PydanticObjectId(author_id)
-        fid = PydanticObjectId(file_id)
+        """
+        Комісія авторам за пачку продажів (id запису журналу, author_id, file_id, сума):
+        один bulk_write з сумарним $inc на автора і один insert_many транзакцій.
+        Суму фіксує запис покупки (commission_for) у момент продажу. Повтор з тим самим
+        token нічого не задвоює: автор пам'ятає застосовані токени, а транзакція
+        винагороди має _id запису журналу.
+        """
+        # 1) Нульові комісії не записуємо
+        credits = [c for c in credits if c[3] > 0]
+        if not credits:
+            return
 
-        # 1) Перевіряємо, що автор існує
-        author = await User.get(aid)
-        if not author:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Author not found"
+        # 2) Видалених авторів пропускаємо
+        authors = {aid for _, aid, _, _ in credits}
+        existing = {
+            raw["_id"] async for raw in User.get_motor_collection().find(
+                {'_id': {'$in': list(authors)}}, projection={'_id': 1},
             )
-
-        # 2) Розраховуємо суму комісії
-        commission_amount = (total_price * cls.BASE_COMMISSION_RATE) // 100
-        if commission_amount <= 0:
+        }
+        credits = [c for c in credits if c[1] in existing]
+        if not credits:
             return
 
-        # 3) Нараховуємо поінти автору
-        await author.update({'$inc': {'points': commission_amount}})
+        # 3) Нараховуємо поінти авторам
+        totals: Counter[PydanticObjectId] = Counter()
+        for _, aid, _, amount in credits:
+            totals[aid] += amount
+        await User.get_motor_collection().bulk_write(
+            [idempotent_inc(aid, {'points': amount}, token) for aid, amount in totals.items()],
+            ordered=False,
+        )
 
-        # 4) Логування транзакції комісії
-        tx = PointRewardTransaction(
-            userId=aid,
-            fileId=fid,
-            amount=commission_amount,
-            reason="author_commission",
-            created_at=datetime.utcnow(),
+        # 4) Логування транзакцій комісії
+        try:
+            await PointRewardTransaction.insert_many([
+                PointRewardTransaction(
+                    id=ledger_id,
+                    userId=aid,
+                    fileId=fid,
+                    amount=amount,
+                    reason="author_commission",
+                ) for ledger_id, aid, fid, amount in credits
+            ], ordered=False)
+        except BulkWriteError as e:
+            ignore_duplicates(e)
+
+    @staticmethod
+    async def commission_summary(author_id: str) -> CommissionSummaryResponse:
+        """Комісія автора: ще в журналі (pending) і вже зарахована на баланс (settled)."""
+        aid = PydanticObjectId(author_id)
+        pending = await FilePurchaseTransaction.get_motor_collection().aggregate([
+            {'$match': {'author_id': aid, 'settled': False}},
+            {'$group': {'_id': None, 'amount': {'$sum': '$commission'}, 'sales': {'$sum': 1}}},
+        ]).to_list(None)
+        settled = await PointRewardTransaction.get_motor_collection().aggregate([
+            {'$match': {'userId': aid, 'reason': 'author_commission'}},
+            {'$group': {'_id': None, 'amount': {'$sum': '$amount'}, 'sales': {'$sum': 1}}},
+        ]).to_list(None)
+        pending = pending[0] if pending else {}
+        settled = settled[0] if settled else {}
+        return CommissionSummaryResponse(
+            pending=pending.get('amount', 0),
+            pending_sales=pending.get('sales', 0),
+            settled=settled.get('amount', 0),
+            settled_sales=settled.get('sales', 0),
         )
-        await tx.insert()
 
     @staticmethod
     async def purchase_points(user_id: str, req: PurchaseRequest) -> None:
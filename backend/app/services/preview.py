@@ -1,6 +1,17 @@
 import math
+import multiprocessing
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from dataclasses import dataclass, field
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, features
 import librosa
 import soundfile as sf
 
@@ -14,129 +25,522 @@ except ImportError:
 def clamp(x, minimum, maximum):
     return max(minimum, min(x, maximum))
 
+
+WATERMARK_FILL = (64, 64, 64, 160)
+
+# Бюджет пікселів за замовчуванням: більші зображення (і decompression bombs) відхиляються до декодування
+MAX_IMAGE_PIXELS = 64_000_000
+
+# Драбина розмірів thumbnail (px по більшій стороні) для srcset
+THUMBNAIL_LADDER = (128, 256, 512, 1024)
+# розмір, який іде в основний thumbnail_key
+THUMBNAIL_SIZE = 256
+
+
+@dataclass(frozen=True)
+class Variants:
+    """Результат generate_variants."""
+    thumbnail: bytes | None
+    preview: bytes | None
+    # {ім'я: (байти, content type)} додаткових рендишенів (напр. драбина thumbnail);
+    # default_factory — у кожного результату свій dict, а не один спільний
+    renditions: dict[str, tuple[bytes, str]] = field(default_factory=dict)
+    # метадані вмісту (напр. perceptual hash), обчислені під час того ж декодування
+    meta: dict[str, str] = field(default_factory=dict)
+    # компактна огинаюча аудіо (WAVEFORM_FORMAT) для waveform на фронтенді
+    waveform: bytes | None = None
+
+
+# Opus підтримує лише ці частоти дискретизації
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# Огинаюча аудіо: WAVEFORM_PEAKS пар (min, max) int8 на весь трек, перед ними заголовок
+# magic, версія, sample rate, семплів на пару, кількість пар (little-endian)
+WAVEFORM_PEAKS = 1024
+WAVEFORM_BLOCK_FRAMES = 65536  # кадрів на одне читання: пам'ять не залежить від тривалості треку
+WAVEFORM_MAGIC = b"O4LW"
+WAVEFORM_HEADER = struct.Struct("<4sB3xIII")
+WAVEFORM_SIZE = (512, 256)
+WAVEFORM_BACKGROUND = (36, 41, 51)
+WAVEFORM_COLOR = (96, 165, 250)
+
+# Відео обробляє зовнішній ffmpeg: файл читається з диска, у Python потрапляють лише кадр постера і кліп
+FFMPEG = shutil.which("ffmpeg") or "ffmpeg"
+VIDEO_CLIP_SECONDS = 10
+VIDEO_CLIP_HEIGHT = 360
+VIDEO_TIMEOUT = 300.0  # секунд на всі виклики ffmpeg для одного файлу, якщо не задано інше
+
+
+@lru_cache(maxsize=32)
+def _load_font(font_size: int) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.truetype("arial.ttf", font_size)
+    except IOError:
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=32)
+def _watermark_stamp(text: str, font_size: int) -> tuple[Image.Image, int, int, int]:
+    """Повернутий на 45° штамп з текстом + крок сітки та зсув (rw, rh). Рендериться один раз."""
+    font = _load_font(font_size)
+    bbox = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)
+    text_w, text_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    padding = int(font_size * 0.2)
+    pw, ph = text_w + 2 * padding, text_h + 2 * padding
+    cos45 = math.cos(math.radians(45))
+    sin45 = math.sin(math.radians(45))
+    rw = int(abs(pw * cos45) + abs(ph * sin45))
+    rh = int(abs(pw * sin45) + abs(ph * cos45))
+    step = max(int(max(rw, rh) * 1.2), 1)
+    txt_img = Image.new('RGBA', (pw, ph), (255, 255, 255, 0))
+    ImageDraw.Draw(txt_img).text((padding, padding), text, fill=WATERMARK_FILL, font=font)
+    return txt_img.rotate(45, expand=True), step, rw, rh
+
+
+@lru_cache(maxsize=8)
+def _watermark_overlay(text: str, width: int, height: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Оверлей для полотна заданого розміру у розрідженому вигляді:
+    (плоскі індекси пікселів з alpha > 0, їхні RGBA-значення N×4 uint8).
+    Сітка штампів періодична з кроком `step`, тож малюємо одну плитку
+    step×step (з переносом через край) і розмножуємо її через np.tile.
+    """
+    font_size = max(int(min(width, height) * 0.05), 1)
+    stamp, step, rw, rh = _watermark_stamp(text, font_size)
+    tile = Image.new('RGBA', (step, step), (255, 255, 255, 0))
+    ox = (-rw - stamp.width // 2) % step
+    oy = (-rh - stamp.height // 2) % step
+    for dx in (0, -step):
+        for dy in (0, -step):
+            tile.paste(stamp, (ox + dx, oy + dy), stamp)
+    reps_y = -(-height // step)
+    reps_x = -(-width // step)
+    overlay = np.tile(np.asarray(tile), (reps_y, reps_x, 1))[:height, :width].reshape(-1, 4)
+    idx = np.flatnonzero(overlay[:, 3])
+    src = overlay[idx]
+    idx.setflags(write=False)
+    src.setflags(write=False)
+    return idx, src
+
+
+def _has_feature(name: str) -> bool:
+    try:
+        return features.check_module(name)
+    except ValueError:  # старий Pillow не знає такого модуля
+        return False
+
+
+# (формат Pillow, розширення, content type, параметри save) — від найкомпактнішого до fallback
+THUMBNAIL_FORMATS = [
+    fmt for fmt, available in [
+        (('AVIF', 'avif', 'image/avif', {'quality': 55, 'speed': 8}), _has_feature('avif')),
+        (('WEBP', 'webp', 'image/webp', {'quality': 75, 'method': 4}), _has_feature('webp')),
+        (('JPEG', 'jpg', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}), True),
+    ] if available
+]
+
+
+class PreviewRejected(ValueError):
+    """Файл не можна (і немає сенсу повторно пробувати) обробити — напр. завеликий."""
+
+
 class PreviewService:
 
     @staticmethod
-    def generate_variants(data: bytes, file_type: str) -> tuple[bytes, bytes]:
+    def needs_decoding(file_type: str) -> bool:
+        """Чи генеруються для типу власні thumbnail/preview (інакше preview — сам оригінал)."""
+        return bool(file_type) and (
+            file_type.startswith("image/")
+            or file_type.startswith("audio/")
+            or file_type.startswith("video/")
+            or file_type == "application/pdf"
+        )
+
+    @staticmethod
+    def thumbnail_content_type(file_type: str) -> str:
+        if file_type and (file_type.startswith("image/") or file_type.startswith("video/")):
+            return "image/jpeg"
+        return "image/png"
+
+    @staticmethod
+    def preview_content_type(file_type: str, original_content_type: str | None) -> str:
+        """Content type згенерованого preview (для типів без декодування — тип оригіналу)."""
+        if file_type and file_type.startswith("image/"):
+            return "image/png"
+        if file_type and file_type.startswith("audio/"):
+            return "audio/ogg"
+        if file_type and file_type.startswith("video/"):
+            return "video/mp4"
+        if file_type == "application/pdf":
+            return "application/pdf"
+        return original_content_type or file_type
+
+    @staticmethod
+    def generate_variants_from_path(
+            path: str,
+            file_type: str,
+            render_processes: int = 1,
+            max_image_pixels: int = MAX_IMAGE_PIXELS,
+            timeout: float | None = None,
+    ) -> Variants:
+        """
+        Те саме, що generate_variants, але читає оригінал з диска (у процесі воркера).
+        timeout обмежує зовнішні процеси (ffmpeg), щоб вони не пережили задачу.
+        """
+        if file_type and file_type.startswith("image/"):
+            # Image.open лінивий: з диска читається лише те, що реально декодується
+            return PreviewService._image_variants(path, max_image_pixels)
+        if file_type and file_type.startswith("audio/"):
+            # аудіо декодується потоково прямо з файлу, без читання в пам'ять
+            return PreviewService._audio_variants(path)
+        if file_type and file_type.startswith("video/"):
+            return PreviewService._video_variants(path, timeout)
+        if file_type == "application/pdf":
+            # сторінки PDF можна рендерити паралельно: кожен процес відкриває файл сам
+            return Variants(*PreviewService._document_variants(path, render_processes))
+        with open(path, "rb") as f:
+            data = f.read()
+        return PreviewService.generate_variants(data, file_type, max_image_pixels)
+
+    @staticmethod
+    def generate_variants(
+            data: bytes,
+            file_type: str,
+            max_image_pixels: int = MAX_IMAGE_PIXELS,
+    ) -> Variants:
         if file_type and file_type.startswith("image/"):
-            return PreviewService._image_variants(data)
+            return PreviewService._image_variants(data, max_image_pixels)
         if file_type and file_type.startswith("audio/"):
             return PreviewService._audio_variants(data)
+        if file_type and file_type.startswith("video/"):
+            # ffmpeg потрібен seekable файл (moov-атом MP4 буває в кінці)
+            with tempfile.NamedTemporaryFile(prefix="video-") as tmp:
+                tmp.write(data)
+                tmp.flush()
+                return PreviewService._video_variants(tmp.name)
         if file_type == "application/pdf":
-            return PreviewService._document_variants(data)
-        return None, data
+            return Variants(*PreviewService._document_variants(data))
+        return Variants(None, data)
 
     @staticmethod
     def _apply_tiled_watermark(base: Image.Image, watermark_text: str) -> Image.Image:
-        overlay = Image.new('RGBA', base.size, (255, 255, 255, 0))
-        draw = ImageDraw.Draw(overlay)
-        font_size = int(min(base.size) * 0.05)
+        idx, src = _watermark_overlay(watermark_text, base.width, base.height)
+        out = np.array(base.convert('RGBA'))
+        flat = out.reshape(-1, 4)
+        # змінюються лише пікселі під штампами (~2% полотна), решта копіюється як є
+        dst = flat[idx]
+        sa = src[:, 3:4].astype(np.uint16)
+        if (dst[:, 3] == 255).all():
+            # непрозора основа (PDF-сторінки, JPEG): цілочисельний blend, alpha лишається 255
+            flat[idx, :3] = ((src[:, :3] * sa + dst[:, :3] * (255 - sa) + 127) // 255).astype(np.uint8)
+        else:
+            # загальний випадок "src over dst" (як Image.alpha_composite)
+            src_f = src.astype(np.float32) / 255.0
+            dst_f = dst.astype(np.float32) / 255.0
+            sa_f, da_f = src_f[:, 3:4], dst_f[:, 3:4]
+            out_a = sa_f + da_f * (1.0 - sa_f)
+            out_rgb = (src_f[:, :3] * sa_f + dst_f[:, :3] * da_f * (1.0 - sa_f)) / np.maximum(out_a, 1e-6)
+            flat[idx] = np.rint(np.concatenate([out_rgb, out_a], axis=-1) * 255.0).astype(np.uint8)
+        return Image.fromarray(out, 'RGBA')
+
+    @staticmethod
+    def _open_image_bounded(source: bytes | str, max_pixels: int, size: int) -> Image.Image:
+        """
+        Декодує зображення одразу приблизно до `size` px по більшій стороні.
+        Розмір перевіряється за заголовком, до декодування пікселів; JPEG декодується
+        через draft() у масштабі 1/2..1/8, решта форматів зменшуються через reduce().
+        """
         try:
-            font = ImageFont.truetype("arial.ttf", font_size)
-        except IOError:
-            font = ImageFont.load_default()
-        bbox = draw.textbbox((0, 0), watermark_text, font=font)
-        text_w, text_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-        padding = int(font_size * 0.2)
-        pw, ph = text_w + 2 * padding, text_h + 2 * padding
-        cos45 = math.cos(math.radians(45))
-        sin45 = math.sin(math.radians(45))
-        rw = int(abs(pw * cos45) + abs(ph * sin45))
-        rh = int(abs(pw * sin45) + abs(ph * cos45))
-        step = max(rw, rh) * 1.2
-        fill = (64, 64, 64, 160)
-        for y in range(-rh, base.height + rh, int(step)):
-            for x in range(-rw, base.width + rw, int(step)):
-                txt_img = Image.new('RGBA', (pw, ph), (255, 255, 255, 0))
-                td = ImageDraw.Draw(txt_img)
-                td.text((padding, padding), watermark_text, fill=fill, font=font)
-                rot = txt_img.rotate(45, expand=True)
-                ox, oy = x - rot.width // 2, y - rot.height // 2
-                overlay.paste(rot, (ox, oy), rot)
-        return Image.alpha_composite(base.convert('RGBA'), overlay)
-
-    @staticmethod
-    def _image_variants(data: bytes) -> tuple[bytes, bytes]:
-        img = Image.open(BytesIO(data)).convert('RGBA')
-        fmt = img.format or 'PNG'
-        # thumbnail з водяним знаком
-        thumb = img.copy()
-        thumb.thumbnail((200, 200))
-        thumb_wm = PreviewService._apply_tiled_watermark(thumb, '© One4Lib')
-        buf_t = BytesIO();
-        thumb_wm.save(buf_t, format=fmt)
-        thumb_bytes = buf_t.getvalue()
+            img = Image.open(BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+        except Image.DecompressionBombError as e:
+            raise PreviewRejected(str(e))
+        w, h = img.size
+        if w * h > max_pixels:
+            raise PreviewRejected(f"Image too large: {w}x{h} px (limit {max_pixels} px)")
+        img.draft('RGB', (size, size))
+        factor = min(img.width // size, img.height // size)
+        if factor >= 2:
+            img = img.reduce(factor)
+        img.thumbnail((size, size))
+        return img.convert('RGBA')
+
+    @staticmethod
+    def _encode_thumbnail(img: Image.Image, fmt: str, params: dict) -> bytes:
+        if fmt == 'JPEG':
+            # JPEG без alpha — накладаємо на білий фон
+            flat = Image.new('RGB', img.size, (255, 255, 255))
+            flat.paste(img, mask=img.getchannel('A'))
+            img = flat
+        buf = BytesIO()
+        img.save(buf, format=fmt, **params)
+        return buf.getvalue()
+
+    @staticmethod
+    def dhash(img: Image.Image) -> str:
+        """
+        64-бітний difference hash (16 hex-символів): стійкий до масштабування
+        і перекодування, тож майже однакові зображення мають малу відстань Хеммінга.
+        """
+        gray = np.asarray(img.convert('L').resize((9, 8), Image.LANCZOS), dtype=np.int16)
+        bits = (gray[:, 1:] > gray[:, :-1]).flatten()
+        return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+    @staticmethod
+    def resize(data: bytes, width: int, height: int, fmt: str) -> bytes:
+        """Вписує зображення (вже з водяним знаком) у width×height і кодує у fmt (AVIF/WEBP/JPEG/PNG)."""
+        img = Image.open(BytesIO(data))
+        img.draft('RGB', (width, height))
+        img.thumbnail((width, height))
+        params = next((p for f, _, _, p in THUMBNAIL_FORMATS if f == fmt), {})
+        return PreviewService._encode_thumbnail(img.convert('RGBA'), fmt, params)
+
+    @staticmethod
+    def _image_variants(source: bytes | str, max_pixels: int = MAX_IMAGE_PIXELS) -> Variants:
+        # одна зменшена база (найбільший щабель драбини), з неї — усі варіанти
+        base = PreviewService._open_image_bounded(source, max_pixels, max(THUMBNAIL_LADDER))
+
+        # драбина thumbnail: кожен щабель зменшується з попереднього, без апскейлу
+        sizes = [s for s in THUMBNAIL_LADDER if s <= max(base.size)] or [min(THUMBNAIL_LADDER)]
+        renditions: dict[str, tuple[bytes, str]] = {}
+        thumb_bytes = None
+        img = base
+        for size in sorted(sizes, reverse=True):
+            img = img.copy()
+            img.thumbnail((size, size))
+            wm = PreviewService._apply_tiled_watermark(img, '© One4Lib')
+            for fmt, ext, mime, params in THUMBNAIL_FORMATS:
+                data = PreviewService._encode_thumbnail(wm, fmt, params)
+                # ім'я містить фактичну ширину — це і є дескриптор для srcset
+                renditions[f"{wm.width}w.{ext}"] = (data, mime)
+                if fmt == 'JPEG' and (size >= THUMBNAIL_SIZE or thumb_bytes is None):
+                    thumb_bytes = data
+
         # preview з водяним знаком
-        prev = img.copy()
+        prev = base.copy()
         prev.thumbnail((800, 800))
         prev_wm = PreviewService._apply_tiled_watermark(prev, '© One4Lib')
-        buf_p = BytesIO();
-        prev_wm.convert('RGB').save(buf_p, format=fmt)
+        buf_p = BytesIO()
+        prev_wm.convert('RGB').save(buf_p, format='PNG')
         prev_bytes = buf_p.getvalue()
-        return thumb_bytes, prev_bytes
-
-    @staticmethod
-    def _audio_variants(data: bytes) -> tuple[bytes, bytes]:
-        # завантажуємо повне аудіо
-        y, sr = librosa.load(BytesIO(data), sr=None)
-        total_samples = len(y)
-        # довжина прев'ю: 20% від загального часу, від 1 до 15 секунд
-        duration_sec = clamp(total_samples / sr * 0.2, 1, 15)
-        snippet_samples = int(duration_sec * sr)
-        snippet = y[:snippet_samples]
-        # експорт у WAV
-        buf_audio = BytesIO()
-        sf.write(buf_audio, snippet, sr, format='WAV')
-        preview_audio = buf_audio.getvalue()
-        # thumbnail — сіра кнопка "Play"
-        thumb = Image.new('RGB', (200, 200), color='gray')
-        draw = ImageDraw.Draw(thumb)
-        triangle = [(80, 60), (80, 140), (140, 100)]
-        draw.polygon(triangle, fill='white')
-        buf_t = BytesIO();
-        thumb.save(buf_t, format='PNG')
-        thumb_bytes = buf_t.getvalue()
-        return thumb_bytes, preview_audio
-
-    @staticmethod
-    def _document_variants(data: bytes) -> tuple[bytes, bytes]:
+        meta = {"phash": PreviewService.dhash(base)}
+        return Variants(thumb_bytes, prev_bytes, renditions, meta)
+
+    @staticmethod
+    def _audio_snippet(source: bytes | str) -> tuple[np.ndarray, int]:
+        """
+        Декодує лише перші N секунд (20% тривалості, від 1 до 15 с) у mono float32.
+        Формати, які soundfile не відкриває або не вміє seek, декодуються повністю через librosa.
+        """
+        src = BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+        try:
+            with sf.SoundFile(src) as f:
+                if f.seekable() and f.frames > 0:
+                    sr = f.samplerate
+                    duration_sec = clamp(f.frames / sr * 0.2, 1, 15)
+                    y = f.read(frames=int(duration_sec * sr), dtype='float32', always_2d=True)
+                    return y.mean(axis=1), sr
+        except RuntimeError:
+            pass
+        if isinstance(src, BytesIO):
+            src.seek(0)
+        y, sr = librosa.load(src, sr=None)
+        duration_sec = clamp(len(y) / sr * 0.2, 1, 15)
+        return y[:int(duration_sec * sr)], sr
+
+    @staticmethod
+    def _encode_ogg(y: np.ndarray, sr: int) -> bytes:
+        """Стискає фрагмент в Ogg/Opus (або Ogg/Vorbis, якщо libsndfile зібрано без Opus)."""
+        if 'OPUS' in sf.available_subtypes('OGG'):
+            if sr not in OPUS_SAMPLE_RATES:
+                y = librosa.resample(y, orig_sr=sr, target_sr=48000)
+                sr = 48000
+            subtype = 'OPUS'
+        else:
+            subtype = 'VORBIS'
+        buf = BytesIO()
+        sf.write(buf, y, sr, format='OGG', subtype=subtype)
+        return buf.getvalue()
+
+    @staticmethod
+    def _envelope(y: np.ndarray, block: int) -> tuple[np.ndarray, np.ndarray]:
+        """min/max кожного блоку з `block` семплів (останній може бути коротшим) — без циклу по семплах."""
+        n = len(y) // block * block
+        mins, maxs = [], []
+        if n:
+            blocks = y[:n].reshape(-1, block)
+            mins.append(blocks.min(axis=1))
+            maxs.append(blocks.max(axis=1))
+        if n < len(y):
+            mins.append(y[n:].min(keepdims=True))
+            maxs.append(y[n:].max(keepdims=True))
+        return np.concatenate(mins or [np.zeros(0, np.float32)]), np.concatenate(maxs or [np.zeros(0, np.float32)])
+
+    @staticmethod
+    def _waveform_peaks(source: bytes | str) -> tuple[np.ndarray, int, int]:
+        """
+        Огинаюча всього треку: (peaks N×2 float32 [min, max], sample rate, семплів на пару).
+        Аудіо читається потоково блоками по WAVEFORM_BLOCK_FRAMES кадрів, тож пам'ять не залежить
+        від тривалості. Пара може розтягнутися на кілька блоків: min/max зливаються в спільні масиви.
+        """
+        src = BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+        try:
+            with sf.SoundFile(src) as f:
+                if f.frames > 0:
+                    sr = f.samplerate
+                    spp = max(1, -(-f.frames // WAVEFORM_PEAKS))
+                    pairs = -(-f.frames // spp)
+                    mins = np.full(pairs, np.inf, np.float32)
+                    maxs = np.full(pairs, -np.inf, np.float32)
+                    pos = 0
+                    for block in f.blocks(blocksize=WAVEFORM_BLOCK_FRAMES, dtype='float32', always_2d=True):
+                        y = block.mean(axis=1)
+                        # відрізки блоку між межами пар; перший може продовжувати пару з попереднього блоку
+                        first = pos // spp
+                        starts = np.arange((first + 1) * spp - pos, len(y), spp)
+                        starts = np.concatenate(([0], starts))
+                        idx = np.minimum(first + np.arange(len(starts)), pairs - 1)
+                        np.minimum.at(mins, idx, np.minimum.reduceat(y, starts))
+                        np.maximum.at(maxs, idx, np.maximum.reduceat(y, starts))
+                        pos += len(y)
+                    seen = min(pairs, -(-pos // spp))
+                    return np.stack([mins[:seen], maxs[:seen]], axis=1), sr, spp
+        except RuntimeError:
+            pass
+        if isinstance(src, BytesIO):
+            src.seek(0)
+        y, sr = librosa.load(src, sr=None)
+        spp = max(1, -(-len(y) // WAVEFORM_PEAKS))
+        lo, hi = PreviewService._envelope(y, spp)
+        return np.stack([lo, hi], axis=1), sr, spp
+
+    @staticmethod
+    def _encode_waveform(peaks: np.ndarray, sr: int, spp: int) -> bytes:
+        data = np.clip(np.rint(peaks * 127), -128, 127).astype(np.int8)
+        return WAVEFORM_HEADER.pack(WAVEFORM_MAGIC, 1, sr, spp, len(data)) + data.tobytes()
+
+    @staticmethod
+    def _render_waveform(peaks: np.ndarray) -> bytes:
+        """PNG з огинаючою: по стовпчику на піксель, масштаб за піком треку."""
+        width, height = WAVEFORM_SIZE
+        if len(peaks) == 0:
+            peaks = np.zeros((1, 2), np.float32)
+        # пари згортаються (min з min, max з max) до ширини картинки
+        edges = np.linspace(0, len(peaks), min(width, len(peaks)) + 1).astype(int)
+        lo = np.minimum.reduceat(peaks[:, 0], edges[:-1])
+        hi = np.maximum.reduceat(peaks[:, 1], edges[:-1])
+        cols = np.linspace(0, len(lo), width, endpoint=False).astype(int)
+        lo, hi = lo[cols], hi[cols]
+        scale = max(float(np.abs(peaks).max()), 1e-3)
+        mid = (height - 1) / 2
+        top = np.rint(mid - hi / scale * mid * 0.9).astype(int)
+        bottom = np.rint(mid - lo / scale * mid * 0.9).astype(int)
+        rows = np.arange(height)[:, None]
+        mask = (rows >= np.minimum(top, bottom)) & (rows <= np.maximum(top, bottom))
+        img = np.empty((height, width, 3), np.uint8)
+        img[:] = WAVEFORM_BACKGROUND
+        img[mask] = WAVEFORM_COLOR
+        buf = BytesIO()
+        Image.fromarray(img, 'RGB').save(buf, format='PNG', optimize=True)
+        return buf.getvalue()
+
+    @staticmethod
+    def _audio_variants(source: bytes | str) -> Variants:
+        snippet, sr = PreviewService._audio_snippet(source)
+        preview_audio = PreviewService._encode_ogg(snippet, sr)
+        peaks, sr, spp = PreviewService._waveform_peaks(source)
+        return Variants(
+            PreviewService._render_waveform(peaks),
+            preview_audio,
+            waveform=PreviewService._encode_waveform(peaks, sr, spp),
+        )
+
+    @staticmethod
+    def _video_variants(path: str, timeout: float | None = None) -> Variants:
+        """
+        Постер — ключовий кадр на ~10% тривалості (з нього та сама драбина thumbnail, що й для
+        зображень), preview — короткий 360p H.264 кліп з тим самим водяним знаком.
+        ffmpeg читає оригінал з диска сам; в пам'ять процесу потрапляють лише результати.
+        """
+        deadline = time.monotonic() + (timeout or VIDEO_TIMEOUT)
+        remaining = lambda: max(deadline - time.monotonic(), 1.0)
+
+        duration, width, height = _probe_video(path, remaining())
+        clip_len = min(VIDEO_CLIP_SECONDS, duration) if duration else VIDEO_CLIP_SECONDS
+        start = clamp(duration * 0.1, 0, max(duration - clip_len, 0))
+
+        # декодуються лише ключові кадри: перший після start і стає постером
+        poster_args = [
+            "-skip_frame", "nokey", "-i", path, "-frames:v", "1",
+            # вписуємо в найбільший щабель драбини, без апскейлу
+            "-vf", f"scale='min(iw,{max(THUMBNAIL_LADDER)})':'min(ih,{max(THUMBNAIL_LADDER)})'"
+                   ":force_original_aspect_ratio=decrease",
+            "-f", "image2pipe", "-c:v", "png", "-",
+        ]
+        poster = _ffmpeg(["-ss", f"{start:.3f}", *poster_args], remaining())
+        if not poster and start:
+            poster = _ffmpeg(poster_args, remaining())
+        if not poster:
+            raise PreviewRejected("Could not extract a video frame")
+        stills = PreviewService._image_variants(poster)
+
+        clip_h = min(VIDEO_CLIP_HEIGHT, height) // 2 * 2
+        clip_w = max(round(width * clip_h / height / 2) * 2, 2)
+        watermark = PreviewService._apply_tiled_watermark(
+            Image.new('RGBA', (clip_w, clip_h), (0, 0, 0, 0)), '© One4Lib'
+        )
+        with tempfile.TemporaryDirectory(prefix="video-") as tmp:
+            wm_path, clip_path = f"{tmp}/wm.png", f"{tmp}/clip.mp4"
+            watermark.save(wm_path)
+            _ffmpeg([
+                "-ss", f"{start:.3f}", "-t", f"{clip_len:.3f}", "-i", path, "-i", wm_path,
+                "-filter_complex", f"[0:v]scale={clip_w}:{clip_h}[v];[v][1:v]overlay=0:0,format=yuv420p[out]",
+                "-map", "[out]", "-map", "0:a:0?",
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", "30", "-maxrate", "600k", "-bufsize", "1200k",
+                "-c:a", "aac", "-b:a", "64k", "-ac", "1",
+                "-movflags", "+faststart", "-y", clip_path,
+            ], remaining())
+            with open(clip_path, "rb") as f:
+                clip = f.read()
+
+        return Variants(stills.thumbnail, clip, stills.renditions)
+
+    @staticmethod
+    def _document_variants(source: bytes | str, render_processes: int = 1) -> tuple[bytes, bytes]:
         """
         Генерує thumbnail (PNG) та preview (PDF) для PDF-документів.
         Preview — новий PDF з водяними знаками, thumbnail — зображення першої сторінки.
+        Сторінки рендеряться один раз (паралельно, якщо source — шлях і render_processes > 1),
+        вставляються в preview як JPEG, а thumbnail береться з уже відрендереної першої сторінки.
         """
         if not HAS_PYMUPDF:
             raise RuntimeError('PyMuPDF required')
 
-        # Відкриваємо оригінал
-        doc = fitz.open(stream=data, filetype='pdf')
-        total = doc.page_count
+        with _open_pdf(source) as doc:
+            total = doc.page_count
         # Вибираємо 20% сторінок, мінімум 1, максимум 5
         count = clamp(int(total * 0.2), 1, 5)
         idxs = [min(int(i * total / count), total - 1) for i in range(count)]
 
+        workers = min(render_processes, len(idxs))
+        if workers > 1 and isinstance(source, str):
+            # fork дешевий і не потребує повторного імпорту модулів у дочірніх процесах
+            ctx = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                pages = list(pool.map(_render_pdf_page, [source] * len(idxs), idxs))
+        else:
+            pages = [_render_pdf_page(source, idx) for idx in idxs]
+
         # Створюємо новий PDF з водяними знаками
         new_pdf = fitz.open()
-        for idx in idxs:
-            pg = doc.load_page(idx)
-            pix = pg.get_pixmap(matrix=fitz.Matrix(150 / 72, 150 / 72))
-            base = Image.frombytes('RGB', (pix.width, pix.height), pix.samples).convert('RGBA')
-            wm = PreviewService._apply_tiled_watermark(base, '© One4Lib')
-
-            npg = new_pdf.new_page(width=pix.width, height=pix.height)
-            buf_img = BytesIO()
-            wm.convert('RGB').save(buf_img, format='PNG')
-            npg.insert_image(fitz.Rect(0, 0, pix.width, pix.height), stream=buf_img.getvalue())
-
-        # Зберігаємо новий PDF у буфер
-        buf_pdf = BytesIO()
-        new_pdf.save(buf_pdf)
-        pdf_bytes = buf_pdf.getvalue()
-
-        # Генеруємо thumbnail: перша сторінка preview PDF
-        preview_doc = fitz.open(stream=pdf_bytes, filetype='pdf')
-        p0 = preview_doc.load_page(0)
-        p0pix = p0.get_pixmap(matrix=fitz.Matrix(200 / 72, 200 / 72))
-        thumb_img = Image.frombytes('RGB', (p0pix.width, p0pix.height), p0pix.samples)
+        for width, height, jpeg in pages:
+            npg = new_pdf.new_page(width=width, height=height)
+            npg.insert_image(fitz.Rect(0, 0, width, height), stream=jpeg)
+        pdf_bytes = new_pdf.tobytes(garbage=3, deflate=True)
+
+        # Thumbnail: перша вже відрендерена сторінка, JPEG декодується одразу у зменшеному масштабі
+        thumb_img = Image.open(BytesIO(pages[0][2]))
+        thumb_img.draft('RGB', (200, 200))
+        thumb_img = thumb_img.convert('RGB')
         thumb_img.thumbnail((200, 200))
 
         buf_thumb = BytesIO()
@@ -144,3 +548,64 @@ class PreviewService:
         thumb_bytes = buf_thumb.getvalue()
 
         return thumb_bytes, pdf_bytes
+
+
+def _ffmpeg(args: list[str], timeout: float) -> bytes:
+    """Запускає ffmpeg і повертає stdout; процес вбивається після timeout."""
+    try:
+        proc = subprocess.run(
+            [FFMPEG, "-hide_banner", "-nostdin", "-loglevel", "error", *args],
+            capture_output=True, timeout=timeout,
+        )
+    except FileNotFoundError:
+        raise RuntimeError('ffmpeg required')
+    except subprocess.TimeoutExpired:
+        raise PreviewRejected(f"Video processing timed out after {timeout:.0f}s")
+    if proc.returncode != 0:
+        # битий/непідтримуваний файл — повтор не допоможе
+        raise PreviewRejected(f"ffmpeg failed: {proc.stderr.decode(errors='replace')[-500:].strip()}")
+    return proc.stdout
+
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_VIDEO_SIZE_RE = re.compile(r"Stream #\S+.*?: Video: .*?, (\d{2,5})x(\d{2,5})\b")
+_ROTATION_RE = re.compile(r"rotation of (-?\d+(?:\.\d+)?) degrees")
+
+
+def _probe_video(path: str, timeout: float) -> tuple[float, int, int]:
+    """(тривалість у секундах, ширина, висота) з заголовка, без декодування кадрів і без ffprobe."""
+    try:
+        proc = subprocess.run([FFMPEG, "-hide_banner", "-nostdin", "-i", path], capture_output=True, timeout=timeout)
+    except FileNotFoundError:
+        raise RuntimeError('ffmpeg required')
+    except subprocess.TimeoutExpired:
+        raise PreviewRejected("Video probe timed out")
+    info = proc.stderr.decode(errors='replace')
+    size = _VIDEO_SIZE_RE.search(info)
+    if not size:
+        raise PreviewRejected("No video stream found")
+    width, height = int(size.group(1)), int(size.group(2))
+    rotation = _ROTATION_RE.search(info)
+    if rotation and round(abs(float(rotation.group(1)))) % 180 == 90:
+        # ffmpeg автоматично повертає кадри, тож на виході сторони міняються місцями
+        width, height = height, width
+    m = _DURATION_RE.search(info)
+    duration = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3)) if m else 0.0
+    return duration, width, height
+
+
+def _open_pdf(source: bytes | str):
+    if isinstance(source, str):
+        return fitz.open(source, filetype='pdf')
+    return fitz.open(stream=source, filetype='pdf')
+
+
+def _render_pdf_page(source: bytes | str, idx: int) -> tuple[int, int, bytes]:
+    """Рендерить сторінку з водяним знаком у JPEG. Модульна функція, щоб її можна було передати у пул."""
+    with _open_pdf(source) as doc:
+        pix = doc.load_page(idx).get_pixmap(matrix=fitz.Matrix(150 / 72, 150 / 72), alpha=False)
+        base = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+    wm = PreviewService._apply_tiled_watermark(base, '© One4Lib')
+    buf_img = BytesIO()
+    wm.convert('RGB').save(buf_img, format='JPEG', quality=85, optimize=True)
+    return pix.width, pix.height, buf_img.getvalue()
@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from beanie import PydanticObjectId
+from pymongo import ReturnDocument
+from app.core.admission import media_kind
+from app.core.config import settings
+from app.core.storage import delete_object, download_to_file, upload_bytes
+from app.core.workers import preview_pool
+from app.models.blobs import BlobVariants
+from app.models.files import File
+from app.models.preview_jobs import PreviewJob
+from app.services.blobs import BlobService
+from app.services.near_duplicates import NearDuplicateService
+from app.services.preview import PreviewRejected, PreviewService
+
+log = logging.getLogger(__name__)
+
+
+class PreviewJobService:
+    """Фонова генерація варіантів (thumbnail/preview) через чергу в Mongo."""
+
+    _wakeup: Optional[asyncio.Event] = None
+    _tasks: list[asyncio.Task] = []
+
+    @staticmethod
+    async def enqueue(
+            file_id: PydanticObjectId,
+            file_type: str,
+            content_type: Optional[str],
+            cost: float = 0.0,
+    ) -> None:
+        job = PreviewJob(
+            file_id=file_id, file_type=file_type, content_type=content_type,
+            kind=media_kind(file_type), cost=cost,
+        )
+        await job.insert()
+        if PreviewJobService._wakeup is not None:
+            PreviewJobService._wakeup.set()
+
+    @staticmethod
+    async def _claim() -> Optional[dict]:
+        """Атомарно бере найстарішу queued-задачу (або running з простроченим lease)."""
+        now = datetime.now(timezone.utc)
+        return await PreviewJob.get_motor_collection().find_one_and_update(
+            {"$or": [
+                {"status": "queued"},
+                {
+                    "status": "running",
+                    "locked_until": {"$lt": now},
+                    "attempts": {"$lt": settings.preview_job_max_attempts},
+                },
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "locked_until": now + timedelta(seconds=settings.preview_job_lease),
+                    "started_at": now,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    async def reap_expired() -> int:
+        """
+        Running-задачі з простроченим lease, у яких спроби вичерпано (воркер помер або
+        завис на останній спробі), _claim уже не перезахопить — позначаємо їх failed
+        разом із файлом. Повертає кількість.
+        """
+        now = datetime.now(timezone.utc)
+        coll = PreviewJob.get_motor_collection()
+        reaped = 0
+        async for raw in coll.find(
+            {
+                "status": "running",
+                "locked_until": {"$lt": now},
+                "attempts": {"$gte": settings.preview_job_max_attempts},
+            },
+            projection={"_id": 1, "file_id": 1},
+        ):
+            # умова повторюється: задачу могли щойно завершити
+            result = await coll.update_one(
+                {"_id": raw["_id"], "status": "running", "locked_until": {"$lt": now}},
+                {"$set": {
+                    "status": "failed",
+                    "error": "Lease expired on the last attempt",
+                    "locked_until": None,
+                    "finished_at": now,
+                    "updated_at": now,
+                }},
+            )
+            if result.modified_count:
+                await File.get_motor_collection().update_one(
+                    {"_id": raw["file_id"], "variants_status": "pending"},
+                    {"$set": {"variants_status": "failed"}},
+                )
+                reaped += 1
+        return reaped
+
+    @staticmethod
+    async def _reap_loop() -> None:
+        while True:
+            try:
+                if n := await PreviewJobService.reap_expired():
+                    log.warning("marked %d stuck preview jobs as failed", n)
+            except Exception:
+                log.exception("preview job reaper failed")
+            await asyncio.sleep(settings.preview_job_reap_interval)
+
+    @staticmethod
+    async def _finish(job_id, status: str, error: Optional[str] = None) -> None:
+        now = datetime.now(timezone.utc)
+        await PreviewJob.get_motor_collection().update_one(
+            {"_id": job_id},
+            {"$set": {
+                "status": status,
+                "error": error,
+                "locked_until": None,
+                "finished_at": now if status in ("done", "failed") else None,
+                "updated_at": now,
+            }},
+        )
+
+    @staticmethod
+    async def generate(doc: File, job: dict, generation: Optional[str] = None) -> BlobVariants:
+        """
+        Генерує й зберігає в S3 варіанти оригіналу doc для job["file_type"].
+        generation — окремий префікс ключів (регенерація не перезаписує чинні варіанти).
+        """
+        preview_content_type = PreviewService.preview_content_type(
+            job["file_type"], job.get("content_type")
+        )
+        if not PreviewService.needs_decoding(job["file_type"]):
+            # декодувати нічого — preview це сам оригінал, без повторного збереження
+            return BlobVariants(file_type=job["file_type"], preview_key=doc.file_key)
+
+        # оригінал спулимо на диск, у пам'ять його читає лише процес-воркер
+        with tempfile.NamedTemporaryFile(prefix="preview-") as tmp:
+            await download_to_file(doc.file_key, tmp)
+            tmp.flush()
+            # ffmpeg отримує трохи менший бюджет, ніж задача: його зупиняє сам воркер
+            # з осмисленою помилкою, і процес пулу не доводиться вбивати
+            timeout = settings.video_preview_timeout if job["file_type"].startswith("video/") else None
+            result = await preview_pool.run(
+                PreviewService.generate_variants_from_path,
+                tmp.name, job["file_type"],
+                settings.pdf_render_processes, settings.max_image_pixels,
+                timeout * 0.9 if timeout else None,
+                timeout=timeout,
+            )
+
+        # усі upload-и йдуть паралельно через async S3-клієнт;
+        # рендишени лежать під ключами, похідними від оригіналу (і покоління при регенерації)
+        prefix = f"{doc.file_key}/thumbs/{generation}/" if generation else f"{doc.file_key}/thumbs/"
+        thumbnail_content_type = PreviewService.thumbnail_content_type(job["file_type"])
+        names = list(result.renditions)
+        thumbnail_key, preview_key, waveform_key, *rendition_keys = await asyncio.gather(
+            upload_bytes(result.thumbnail, thumbnail_content_type) if result.thumbnail else asyncio.sleep(0),
+            upload_bytes(result.preview, preview_content_type) if result.preview else asyncio.sleep(0),
+            upload_bytes(result.waveform, "application/octet-stream", key=f"{prefix}waveform.dat")
+            if result.waveform else asyncio.sleep(0),
+            *(
+                upload_bytes(data, mime, key=f"{prefix}{name}")
+                for name, (data, mime) in result.renditions.items()
+            ),
+        )
+        return BlobVariants(
+            file_type=job["file_type"],
+            thumbnail_key=thumbnail_key,
+            preview_key=preview_key,
+            thumbnail_variants=dict(zip(names, rendition_keys)),
+            waveform_key=waveform_key,
+            phash=result.meta.get("phash"),
+            generated_at=datetime.now(timezone.utc),
+        )
+
+    @staticmethod
+    async def _variants_for(doc: File, job: dict) -> BlobVariants:
+        """Варіанти з індексу вмісту, якщо такі байти вже оброблялись; інакше — генерація."""
+        sha = doc.content_sha256
+        if sha:
+            known = await BlobService.get_variants(sha, job["file_type"])
+            if known:
+                return known
+        variants = await PreviewJobService.generate(doc, job)
+        if sha and not await BlobService.record_variants(sha, variants):
+            # паралельна задача для тих самих байтів встигла першою — беремо її варіанти
+            winner = await BlobService.get_variants(sha, job["file_type"])
+            ours = {variants.thumbnail_key, variants.preview_key} - {
+                winner.thumbnail_key, winner.preview_key, doc.file_key, None
+            }
+            await asyncio.gather(*(delete_object(k) for k in ours))
+            variants = winner
+        return variants
+
+    @staticmethod
+    async def process(job: dict) -> None:
+        doc = await File.get(job["file_id"])
+        if not doc:
+            await PreviewJobService._finish(job["_id"], "failed", "File not found")
+            return
+        try:
+            variants = await PreviewJobService._variants_for(doc, job)
+        except Exception as e:
+            log.exception("preview job %s failed", job["_id"])
+            # PreviewRejected детермінований (напр. завелике зображення) — повтор не допоможе
+            retryable = not isinstance(e, PreviewRejected)
+            if retryable and job["attempts"] < settings.preview_job_max_attempts:
+                await PreviewJobService._finish(job["_id"], "queued", str(e))
+            else:
+                await PreviewJobService._finish(job["_id"], "failed", str(e))
+                await doc.update({"$set": {"variants_status": "failed"}})
+            return
+
+        await doc.update({"$set": {
+            "thumbnail_key": variants.thumbnail_key,
+            "preview_key": variants.preview_key,
+            "thumbnail_variants": variants.thumbnail_variants,
+            "waveform_key": variants.waveform_key,
+            "variants_status": "ready",
+        }})
+        if variants.phash:
+            await NearDuplicateService.register(doc, variants.phash)
+        await PreviewJobService._finish(job["_id"], "done")
+
+    @staticmethod
+    async def _worker_loop() -> None:
+        wakeup = PreviewJobService._wakeup
+        while True:
+            try:
+                job = await PreviewJobService._claim()
+            except Exception:
+                log.exception("failed to claim preview job")
+                job = None
+            if job is None:
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), settings.preview_queue_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await PreviewJobService.process(job)
+            except Exception:
+                # задача лишається running: після lease її перезахопить _claim,
+                # а якщо спроби вичерпано — позначить failed reap_expired
+                log.exception("preview job %s crashed", job["_id"])
+
+    @staticmethod
+    def start() -> None:
+        PreviewJobService._wakeup = asyncio.Event()
+        PreviewJobService._tasks = [
+            asyncio.create_task(PreviewJobService._worker_loop())
+            for _ in range(settings.preview_workers)
+        ]
+        PreviewJobService._tasks.append(asyncio.create_task(PreviewJobService._reap_loop()))
+
+    @staticmethod
+    async def stop() -> None:
+        for t in PreviewJobService._tasks:
+            t.cancel()
+        await asyncio.gather(*PreviewJobService._tasks, return_exceptions=True)
+        PreviewJobService._tasks = []
+        PreviewJobService._wakeup = None
@@ -0,0 +1,251 @@
+"""
+Масова регенерація thumbnail/preview для вже завантажених файлів
+(після зміни водяного знака, драбини розмірів тощо).
+
+    python -m app.services.regenerate_variants --run-id watermark-2026 [--types image,application/pdf]
+        [--rate 5] [--concurrency 2] [--workers 2] [--batch 50] [--restart] [--dry-run]
+
+Файли обходяться курсором за зростанням _id; після кожної пачки checkpoint
+(останній _id і лічильники) зберігається в Mongo, тож перерваний прогін
+з тим самим --run-id продовжується з місця зупинки.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Optional
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core import storage
+from app.core.config import settings
+from app.core.storage import delete_object
+from app.core.workers import preview_pool
+from app.models.blobs import BlobVariants, ContentBlob
+from app.models.files import File
+from app.models.preview_jobs import PreviewJob, VariantRegenerationRun
+from app.services.blobs import BlobService
+from app.services.near_duplicates import NearDuplicateService
+from app.services.preview import PreviewService
+from app.services.preview_jobs import PreviewJobService
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TYPES = ("image/", "audio/", "application/pdf")
+# скільки id невдалих файлів зберігати в checkpoint
+MAX_FAILED_IDS = 1000
+
+
+def _kind(file_type: str) -> str:
+    return "pdf" if file_type == "application/pdf" else file_type.split("/", 1)[0]
+
+
+def _keys(v: BlobVariants | File) -> set[str]:
+    return {k for k in (v.thumbnail_key, v.preview_key, v.waveform_key) if k} | set(v.thumbnail_variants.values())
+
+
+class _Throttle:
+    """Не більше `rate` стартів на секунду (0 — без обмеження), щоб не витісняти живий API."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+            self._next = max(now, self._next) + self.interval
+
+
+class _Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.by_kind: Counter[str] = Counter()
+        self.started = time.monotonic()
+
+    def line(self, run: VariantRegenerationRun) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        rates = " ".join(f"{k} {n / elapsed:.2f}/s" for k, n in sorted(self.by_kind.items()))
+        pct = self.done / self.total * 100 if self.total else 100.0
+        eta = (self.total - self.done) / (self.done / elapsed) if self.done else 0
+        return (
+            f"{self.done}/{self.total} ({pct:.1f}%) {rates or '-'} | "
+            f"skipped {run.skipped} failed {run.failed} | ETA {int(eta // 60)}m{int(eta % 60):02d}s"
+        )
+
+
+class VariantRegenerationService:
+    """Регенерація варіантів одного файлу і прогін по всій колекції з checkpoint-ами."""
+
+    @staticmethod
+    def _query(run: VariantRegenerationRun) -> dict:
+        query: dict = {
+            "file_type": {"$regex": "^(" + "|".join(t.replace("/", "\\/") for t in run.file_types) + ")"},
+            # pending обробляє черга задач — вона й так згенерує варіанти поточним кодом
+            "variants_status": {"$ne": "pending"},
+        }
+        if run.last_file_id:
+            query["_id"] = {"$gt": run.last_file_id}
+        return query
+
+    @staticmethod
+    async def regenerate(doc: File, run: VariantRegenerationRun, generation: str) -> bool:
+        """Повертає False, якщо для файлу нічого регенерувати."""
+        if not PreviewService.needs_decoding(doc.file_type):
+            return False
+        sha = doc.content_sha256
+        old = await BlobService.get_variants(sha, doc.file_type) if sha else None
+
+        if old and old.generated_at and old.generated_at >= run.started_at:
+            # той самий вміст уже перегенеровано в цьому прогоні (дублікат або повтор пачки)
+            variants, stale = old, set()
+        else:
+            job = {"file_type": doc.file_type, "content_type": None}
+            variants = await PreviewJobService.generate(doc, job, generation)
+            if sha:
+                await BlobService.replace_variants(sha, variants)
+            stale = _keys(old or doc) - _keys(variants) - {doc.file_key}
+
+        # варіанти спільні для всіх File з тим самим вмістом і типом
+        targets = (
+            await File.find({"content_sha256": sha, "file_type": doc.file_type}).to_list()
+            if sha else [doc]
+        )
+        await File.get_motor_collection().update_many(
+            {"_id": {"$in": [t.id for t in targets]}},
+            {"$set": {
+                "thumbnail_key": variants.thumbnail_key,
+                "preview_key": variants.preview_key,
+                "thumbnail_variants": variants.thumbnail_variants,
+                "waveform_key": variants.waveform_key,
+                "variants_status": "ready",
+            }},
+        )
+        if variants.phash:
+            for t in targets:
+                if t.phash != variants.phash:
+                    await NearDuplicateService.register(t, variants.phash)
+        # старі об'єкти видаляються лише після того, як на них ніщо не посилається
+        await asyncio.gather(*(delete_object(k) for k in stale))
+        return True
+
+    @staticmethod
+    async def run(
+            run: VariantRegenerationRun,
+            rate: float,
+            concurrency: int,
+            batch_size: int,
+            dry_run: bool = False,
+    ) -> None:
+        total = await File.find(VariantRegenerationService._query(run)).count()
+        log.info("run %s: %d files to process (from %s)", run.id, total, run.last_file_id or "start")
+        if dry_run:
+            return
+        # ключі рендишенів цього прогону: нові об'єкти не перетинаються зі старими (і з дисковим кешем)
+        generation = run.started_at.strftime("%Y%m%d%H%M%S")
+        throttle = _Throttle(rate)
+        limit = asyncio.Semaphore(concurrency)
+        progress = _Progress(total)
+        # файли з однаковим вмістом обробляються по черзі: другий просто підхопить варіанти першого
+        content_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+        async def process(doc: File) -> tuple[File, Optional[bool]]:
+            async with content_locks[doc.content_sha256 or str(doc.id)], limit:
+                await throttle.wait()
+                try:
+                    return doc, await VariantRegenerationService.regenerate(doc, run, generation)
+                except Exception:
+                    log.exception("failed to regenerate variants for %s", doc.id)
+                    return doc, None
+
+        while True:
+            docs = await (
+                File.find(VariantRegenerationService._query(run))
+                .sort("+_id").limit(batch_size).to_list()
+            )
+            if not docs:
+                break
+            for doc, ok in await asyncio.gather(*(process(d) for d in docs)):
+                if ok is None:
+                    run.failed += 1
+                    if len(run.failed_ids) < MAX_FAILED_IDS:
+                        run.failed_ids.append(doc.id)
+                elif ok:
+                    kind = _kind(doc.file_type)
+                    run.processed[kind] = run.processed.get(kind, 0) + 1
+                    progress.by_kind[kind] += 1
+                else:
+                    run.skipped += 1
+            progress.done += len(docs)
+            # checkpoint лише після всієї пачки: при рестарті повториться щонайбільше одна пачка
+            run.last_file_id = docs[-1].id
+            run.updated_at = datetime.now(timezone.utc)
+            await run.save()
+            log.info(progress.line(run))
+
+        run.finished_at = datetime.now(timezone.utc)
+        await run.save()
+        log.info("run %s finished: processed %s, skipped %d, failed %d",
+                 run.id, dict(run.processed), run.skipped, run.failed)
+
+
+async def _load_run(run_id: str, file_types: list[str], restart: bool) -> VariantRegenerationRun:
+    run = await VariantRegenerationRun.get(run_id)
+    if run and not restart:
+        if run.finished_at:
+            log.info("run %s already finished at %s; use --restart to run it again", run_id, run.finished_at)
+        return run
+    if run:
+        await run.delete()
+    run = VariantRegenerationRun(_id=run_id, file_types=file_types)
+    await run.insert()
+    return run
+
+
+async def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--run-id", required=True, help="checkpoint name; the same id resumes the run")
+    parser.add_argument("--types", default=",".join(DEFAULT_TYPES),
+                        help="comma-separated file_type prefixes (new runs only)")
+    parser.add_argument("--rate", type=float, default=0, help="max files started per second (0 = unlimited)")
+    parser.add_argument("--concurrency", type=int, default=settings.preview_workers)
+    parser.add_argument("--workers", type=int, default=settings.preview_workers, help="render processes")
+    parser.add_argument("--batch", type=int, default=50, help="files per checkpoint")
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint and start over")
+    parser.add_argument("--dry-run", action="store_true", help="only count the files left to process")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    client = AsyncIOMotorClient(settings.mongo_uri, tz_aware=True)
+    await init_beanie(
+        database=client.get_default_database(),
+        document_models=[File, ContentBlob, PreviewJob, VariantRegenerationRun],
+    )
+    run = await _load_run(args.run_id, args.types.split(","), args.restart)
+    if run.finished_at:
+        client.close()
+        return 0
+
+    await NearDuplicateService.rebuild()
+    await storage.start()
+    preview_pool.workers = args.workers
+    preview_pool.start()
+    try:
+        await VariantRegenerationService.run(run, args.rate, args.concurrency, args.batch, args.dry_run)
+    finally:
+        preview_pool.shutdown()
+        await storage.close()
+        client.close()
+    return 1 if run.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
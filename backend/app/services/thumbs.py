@@ -0,0 +1,119 @@
+import asyncio
+import bisect
+import hashlib
+from typing import Optional
+from beanie import PydanticObjectId
+from bson import ObjectId
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.core.disk_cache import DiskLRUCache
+from app.core.storage import download_bytes
+from app.models.files import File
+from app.services.preview import THUMBNAIL_FORMATS, PreviewService
+
+# Розміри нормалізуються вгору до найближчого бакета, щоб кеш лишався малим
+SIZE_BUCKETS = (64, 128, 192, 256, 384, 512, 768, 1024)
+
+# fmt-параметр -> (формат Pillow, content type)
+_FORMATS = {f.lower(): (f, mime) for f, _, mime, _ in THUMBNAIL_FORMATS}
+_FORMATS["png"] = ("PNG", "image/png")
+_FORMAT_ALIASES = {"jpg": "jpeg"}
+
+thumb_cache = DiskLRUCache(settings.thumb_cache_dir, settings.thumb_cache_max_bytes)
+
+
+def _bucket(size: int) -> int:
+    i = bisect.bisect_left(SIZE_BUCKETS, size)
+    return SIZE_BUCKETS[min(i, len(SIZE_BUCKETS) - 1)]
+
+
+class ThumbService:
+    """Thumbnail довільного розміру з preview/рендишенів, з дисковим LRU-кешем."""
+
+    # ключ кешу -> Future рендеру, щоб одночасні промахи рахувались один раз
+    _inflight: dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def normalize(w: int, h: Optional[int], fmt: str, accept: str = "") -> tuple[int, int, str]:
+        w = _bucket(w)
+        h = _bucket(h) if h else 0
+        fmt = _FORMAT_ALIASES.get(fmt.lower(), fmt.lower())
+        if fmt == "auto":
+            # найкомпактніший формат, який приймає клієнт
+            fmt = next(
+                (f for f in ("avif", "webp") if f in _FORMATS and f"image/{f}" in accept),
+                "jpeg",
+            )
+        if fmt not in _FORMATS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported format: {fmt}"
+            )
+        return w, h, fmt
+
+    @staticmethod
+    def _source_key(doc: File, w: int) -> Optional[str]:
+        # найменший JPEG-рендишен, не вужчий за запит; інакше preview/thumbnail
+        jpgs = sorted(
+            (int(name.split("w.", 1)[0]), key)
+            for name, key in doc.thumbnail_variants.items() if name.endswith(".jpg")
+        )
+        for width, key in jpgs:
+            if width >= w:
+                return key
+        if doc.file_type.startswith("image/") and doc.preview_key:
+            return doc.preview_key
+        if jpgs:
+            return jpgs[-1][1]
+        return doc.thumbnail_key
+
+    @staticmethod
+    async def _render(source_key: str, w: int, h: int, fmt: str) -> bytes:
+        data = await download_bytes(source_key)
+        pil_fmt, _ = _FORMATS[fmt]
+        return await asyncio.to_thread(PreviewService.resize, data, w, h or w * 4, pil_fmt)
+
+    @staticmethod
+    async def get_thumb(file_id: str, w: int, h: int, fmt: str) -> tuple[bytes, str, str]:
+        """Повертає (байти, ETag, content type). Параметри мають бути вже нормалізовані."""
+        # некоректний id — той самий 404, а не InvalidId (500)
+        doc = await File.get(PydanticObjectId(file_id)) if ObjectId.is_valid(file_id) else None
+        if not doc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+        source_key = ThumbService._source_key(doc, w)
+        if not source_key:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Thumbnail not ready")
+
+        # ключ включає S3-ключ джерела, тож регенерація варіантів інвалідовує кеш сама
+        cache_key = f"{source_key}:{w}x{h}.{fmt}"
+        data = await thumb_cache.get(cache_key)
+        while data is None:
+            fut = ThumbService._inflight.get(cache_key)
+            if fut is None:
+                fut = asyncio.get_running_loop().create_future()
+                ThumbService._inflight[cache_key] = fut
+                try:
+                    data = await ThumbService._render(source_key, w, h, fmt)
+                    await thumb_cache.put(cache_key, data)
+                    fut.set_result(data)
+                except Exception as e:
+                    fut.set_exception(e)
+                    # виняток забере той, хто чекав; власник кидає свій
+                    fut.exception()
+                    raise
+                finally:
+                    # власника скасовано (клієнт відключився) — звільняємо тих, хто чекав
+                    if not fut.done():
+                        fut.cancel()
+                    ThumbService._inflight.pop(cache_key, None)
+            else:
+                try:
+                    data = await asyncio.shield(fut)
+                except asyncio.CancelledError:
+                    # скасували саме цей запит — виходимо; скасовано лише власника —
+                    # наступна ітерація рендерить заново (або чекає нового власника)
+                    if not fut.cancelled() or asyncio.current_task().cancelling():
+                        raise
+
+        etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+        return data, etag, _FORMATS[fmt][1]
@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+from beanie import PydanticObjectId
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from app.core.admission import admission
+from app.core.config import settings
+from app.core.storage import (
+    MULTIPART_CHUNK_SIZE, abort_multipart_upload, complete_multipart_upload,
+    create_multipart_upload, iter_object, new_key, upload_part,
+)
+from app.models.uploads import UploadSession
+from app.schemas.files import FileUploadRequest, UploadCreateRequest, UploadSessionResponse
+from app.services.blobs import BlobService
+from app.services.files import FileService
+
+log = logging.getLogger(__name__)
+
+# S3 дозволяє щонайбільше 10 000 part-ів на один multipart upload
+MAX_UPLOAD_SIZE = MULTIPART_CHUNK_SIZE * 10_000
+# секунд, протягом яких фіналізацію сесії / запис part-а не може перехопити інший запит
+FINALIZE_LEASE = 300
+PART_WRITE_LEASE = 300
+
+
+class OffsetMismatch(HTTPException):
+    def __init__(self, offset: int):
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload-Offset does not match the session offset",
+            headers={"Upload-Offset": str(offset)},
+        )
+
+
+class UploadService:
+    """
+    Chunked, відновлювані завантаження (у стилі tus): сесія -> PATCH-і з офсетами -> File.
+    Кожні MULTIPART_CHUNK_SIZE байтів тіла PATCH одразу йдуть у S3 як part, а офсет
+    фіксується в Mongo, тож обірване з'єднання втрачає щонайбільше неповний part.
+    """
+
+    # SHA-256 недописаних сесій: (офсет, hasher). Стан живе лише в цьому процесі —
+    # якщо PATCH-і потрапили на інший процес, хеш при фіналізації рахується з S3.
+    _hashers: dict[PydanticObjectId, tuple] = {}
+    _sweeper: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def to_response(session: UploadSession) -> UploadSessionResponse:
+        return UploadSessionResponse(
+            id=str(session.id),
+            offset=session.offset,
+            size=session.size,
+            chunk_size=MULTIPART_CHUNK_SIZE,
+            status=session.status,
+            expires_at=session.expires_at,
+            file_id=str(session.file_id) if session.file_id else None,
+        )
+
+    @staticmethod
+    def _expiry() -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=settings.upload_session_ttl)
+
+    @staticmethod
+    async def create(author_id: str, req: UploadCreateRequest) -> UploadSession:
+        if req.size > MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File is larger than {MAX_UPLOAD_SIZE} bytes"
+            )
+        # перевірка лише при відкритті сесії: прийняте завантаження фіналізується завжди
+        await admission.check(req.meta.file_type, req.size)
+        content_type = req.content_type or "application/octet-stream"
+        key = new_key()
+        session = UploadSession(
+            author_id=PydanticObjectId(author_id),
+            key=key,
+            s3_upload_id=await create_multipart_upload(key, content_type),
+            size=req.size,
+            content_type=content_type,
+            meta=req.meta.model_dump(),
+            expires_at=UploadService._expiry(),
+        )
+        await session.insert()
+        UploadService._hashers[session.id] = (0, hashlib.sha256())
+        return session
+
+    @staticmethod
+    async def get(upload_id: str, author_id: str) -> UploadSession:
+        try:
+            session = await UploadSession.get(PydanticObjectId(upload_id))
+        except Exception:
+            session = None
+        if not session or str(session.author_id) != author_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+        return session
+
+    @staticmethod
+    async def _store_part(session: UploadSession, data: bytes) -> None:
+        """
+        Пише part у S3 і зсуває офсет. Офсет і номер part-а спершу захоплюються в Mongo
+        (lease з токеном), тож паралельний PATCH з тим самим офсетом отримує 409 ще до
+        запису в S3 і не може перезаписати чужий part.
+        """
+        coll = UploadSession.get_motor_collection()
+        now = datetime.now(timezone.utc)
+        token = uuid.uuid4().hex
+        claimed = await coll.find_one_and_update(
+            {
+                "_id": session.id, "offset": session.offset, "status": "active",
+                "$or": [{"writer": None}, {"writer_until": {"$lt": now}}],
+            },
+            {"$set": {"writer": token, "writer_until": now + timedelta(seconds=PART_WRITE_LEASE)}},
+            projection={"parts": 1},
+        )
+        if claimed is None:
+            current = await UploadSession.get(session.id)
+            raise OffsetMismatch(current.offset if current else session.offset)
+
+        try:
+            part = await upload_part(session.key, session.s3_upload_id, len(claimed["parts"]) + 1, data)
+        except Exception:
+            await coll.update_one({"_id": session.id, "writer": token}, {"$set": {"writer": None, "writer_until": None}})
+            raise
+        raw = await coll.find_one_and_update(
+            {"_id": session.id, "writer": token},
+            {
+                "$set": {
+                    "offset": session.offset + len(data),
+                    "expires_at": UploadService._expiry(),
+                    "writer": None,
+                    "writer_until": None,
+                },
+                "$push": {"parts": part},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if raw is None:
+            # lease прострочився і офсет перехопив інший запит
+            current = await UploadSession.get(session.id)
+            raise OffsetMismatch(current.offset if current else session.offset)
+
+        tracked = UploadService._hashers.get(session.id)
+        if tracked and tracked[0] == session.offset:
+            tracked[1].update(data)
+            UploadService._hashers[session.id] = (session.offset + len(data), tracked[1])
+        else:
+            UploadService._hashers.pop(session.id, None)
+        session.offset = raw["offset"]
+        session.parts = raw["parts"]
+        session.expires_at = raw["expires_at"]
+
+    @staticmethod
+    async def append(session: UploadSession, offset: int, body: AsyncIterator[bytes]) -> UploadSession:
+        """
+        Дописує тіло PATCH починаючи з `offset`. Повні part-и зберігаються одразу;
+        хвіст, коротший за part, приймається лише як кінець файлу — інакше відкидається,
+        і клієнт продовжує з повернутого офсету.
+        """
+        if session.status == "done":
+            # повтор після втраченої відповіді: файл уже зареєстровано, відповідь несе file_id
+            return session
+        if session.status == "completing":
+            # попередня фіналізація обірвалась (або ще йде в іншому запиті)
+            await UploadService._finalize(session)
+            return session
+        if offset != session.offset:
+            raise OffsetMismatch(session.offset)
+
+        buf = bytearray()
+        async for piece in body:
+            if session.offset + len(buf) + len(piece) > session.size:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Chunk exceeds the declared Upload-Length"
+                )
+            buf += piece
+            while len(buf) >= MULTIPART_CHUNK_SIZE:
+                await UploadService._store_part(session, bytes(buf[:MULTIPART_CHUNK_SIZE]))
+                del buf[:MULTIPART_CHUNK_SIZE]
+        if buf and session.offset + len(buf) == session.size:
+            await UploadService._store_part(session, bytes(buf))
+
+        if session.offset == session.size:
+            await UploadService._finalize(session)
+        return session
+
+    @staticmethod
+    async def _sha256(session: UploadSession) -> str:
+        tracked = UploadService._hashers.pop(session.id, None)
+        if tracked and tracked[0] == session.size:
+            return tracked[1].hexdigest()
+        hasher = hashlib.sha256()
+        async for chunk in iter_object(session.key):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+    @staticmethod
+    async def _finalize(session: UploadSession) -> None:
+        """
+        Збирає part-и в об'єкт і реєструє File тим самим шляхом, що й звичайний upload.
+        Зроблені кроки фіксуються в сесії; якщо фіналізація обірвалась, наступний PATCH
+        повторює її з того ж місця. Паралельні спроби розводить lease.
+        """
+        now = datetime.now(timezone.utc)
+        raw = await UploadSession.get_motor_collection().find_one_and_update(
+            {
+                "_id": session.id,
+                "offset": session.size,
+                "$or": [
+                    {"status": "active"},
+                    {"status": "completing", "locked_until": {"$not": {"$gte": now}}},
+                ],
+            },
+            {"$set": {"status": "completing", "locked_until": now + timedelta(seconds=FINALIZE_LEASE)}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if raw is None:
+            return
+        session.status = "completing"
+        session.assembled = raw.get("assembled", False)
+        session.sha256 = raw.get("sha256")
+        try:
+            if not session.assembled:
+                await complete_multipart_upload(session.key, session.s3_upload_id, session.parts)
+                session.assembled = True
+                await session.update({"$set": {"assembled": True}})
+            if not session.sha256:
+                # до register: після нього об'єкт-дублікат уже може бути видалений
+                session.sha256 = await UploadService._sha256(session)
+                await session.update({"$set": {"sha256": session.sha256}})
+            # при збої register сам відкочує File і посилання на вміст, байти лишаються
+            file_id = await FileService.register(
+                str(session.author_id),
+                FileUploadRequest(**session.meta),
+                session.key,
+                session.sha256,
+                session.size,
+                session.content_type,
+            )
+        except Exception:
+            await session.update({"$set": {"locked_until": None}})
+            raise
+        session.status = "done"
+        session.file_id = PydanticObjectId(file_id)
+        # завершена сесія ще якийсь час відповідає на HEAD/PATCH-повтори з file_id
+        session.expires_at = UploadService._expiry()
+        await session.update({"$set": {
+            "status": session.status, "file_id": session.file_id,
+            "expires_at": session.expires_at, "locked_until": None,
+        }})
+
+    @staticmethod
+    async def abort(session: UploadSession) -> None:
+        if session.status == "done":
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload is already complete")
+        if session.status == "completing":
+            # фіналізація могла вже зареєструвати File — скасовувати пізно
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload is being completed")
+        await abort_multipart_upload(session.key, session.s3_upload_id)
+        await session.delete()
+        UploadService._hashers.pop(session.id, None)
+
+    @staticmethod
+    async def expire_abandoned() -> int:
+        """Скасовує S3 multipart upload-и прострочених сесій і видаляє їх; повертає кількість."""
+        now = datetime.now(timezone.utc)
+        expired = await UploadSession.find({"expires_at": {"$lt": now}}).to_list()
+        for session in expired:
+            try:
+                if session.status != "done" and not session.assembled:
+                    await abort_multipart_upload(session.key, session.s3_upload_id)
+                if session.status == "completing" and session.assembled:
+                    # об'єкт зібрано, але File так і не створено; якщо на ці байти вже
+                    # посилається ContentBlob, discard їх не чіпає
+                    await BlobService.discard(session.key)
+                await session.delete()
+            except Exception:
+                log.exception("failed to expire upload session %s", session.id)
+            UploadService._hashers.pop(session.id, None)
+        return len(expired)
+
+    @staticmethod
+    async def _sweep_loop() -> None:
+        while True:
+            try:
+                if n := await UploadService.expire_abandoned():
+                    log.info("expired %d abandoned upload sessions", n)
+            except Exception:
+                log.exception("upload session sweep failed")
+            await asyncio.sleep(settings.upload_session_sweep_interval)
+
+    @staticmethod
+    def start() -> None:
+        UploadService._sweeper = asyncio.create_task(UploadService._sweep_loop())
+
+    @staticmethod
+    async def stop() -> None:
+        if UploadService._sweeper is not None:
+            UploadService._sweeper.cancel()
+            await asyncio.gather(UploadService._sweeper, return_exceptions=True)
+            UploadService._sweeper = None
@@ -0,0 +1,62 @@
+import os
+
+# Settings читаються під час імпорту app.*; справжні сервіси тестам не потрібні
+for name, value in {
+    "MONGO_URI": "mongodb://localhost/test",
+    "JWT_SECRET": "test",
+    "AWS_ACCESS_KEY_ID": "test",
+    "AWS_SECRET_ACCESS_KEY": "test",
+    "AWS_BUCKET_NAME": "test",
+    "AWS_REGION": "us-east-1",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest_asyncio
+from beanie import init_beanie
+from mongomock_motor import AsyncMongoMockClient
+
+from app.core import database
+from app.models.account import User
+from app.models.files import File
+from app.models.file_purchase import FilePurchaseTransaction
+from app.models.points import PointPurchaseTransaction, PointRewardTransaction
+from app.models.uploads import UploadSession
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def db(monkeypatch):
+    """Порожня in-memory база на кожен тест; як standalone mongod — без транзакцій."""
+    client = AsyncMongoMockClient(tz_aware=True)
+    await init_beanie(
+        database=client["test"],
+        document_models=[
+            User, File, FilePurchaseTransaction, PointPurchaseTransaction, PointRewardTransaction, UploadSession,
+        ],
+    )
+    monkeypatch.setattr(database, "_transactions_supported", False)
+    yield client["test"]
+
+
+@pytest_asyncio.fixture
+async def author():
+    user = User(username="author", email="author@example.com", password="x")
+    await user.insert()
+    return user
+
+
+@pytest_asyncio.fixture
+async def make_buyer():
+    async def make(points: int) -> User:
+        user = User(username="buyer", email=f"buyer{points}-{os.urandom(4).hex()}@example.com", password="x", points=points)
+        await user.insert()
+        return user
+    return make
+
+
+@pytest_asyncio.fixture
+async def make_file(author):
+    async def make(price: int) -> File:
+        f = File(author_id=author.id, file_key=f"key-{price}", file_type="image", title="file", price=price)
+        await f.insert()
+        return f
+    return make
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from bson import ObjectId
+
+from app.core.database import APPLIED_TOKENS_KEPT, idempotent_inc
+from app.models.account import User
+from app.models.files import File
+from app.models.file_purchase import FilePurchaseTransaction
+from app.models.points import PointRewardTransaction
+from app.services.file_purchase import FilePurchaseService
+from app.services.points import PointsService
+
+
+@pytest.fixture
+async def sales(make_buyer, make_file):
+    """Два покупці купили один і той самий файл за 50 поінтів."""
+    f = await make_file(50)
+    for _ in range(2):
+        buyer = await make_buyer(100)
+        await FilePurchaseService.purchase_file(str(buyer.id), str(f.id))
+    return f
+
+
+async def assert_applied_once(f: File, author: User) -> None:
+    assert (await File.get(f.id)).purchase_count == 2
+    assert (await User.get(author.id)).points == 2 * PointsService.commission_for(50)
+    assert await PointRewardTransaction.count() == 2
+    assert await FilePurchaseTransaction.find(FilePurchaseTransaction.settled == False).count() == 0
+
+
+async def expire_leases() -> None:
+    await FilePurchaseTransaction.get_motor_collection().update_many(
+        {"settled": False}, {"$set": {"flush_until": datetime.now(timezone.utc) - timedelta(seconds=1)}},
+    )
+
+
+async def test_flush_applies_counts_and_commissions_once(sales, author):
+    assert await FilePurchaseService.flush() == 2
+    assert await FilePurchaseService.flush() == 0
+
+    await assert_applied_once(sales, author)
+
+
+async def test_flush_that_crashed_before_commissions_is_replayed(sales, author, monkeypatch):
+    async def crash(*args, **kwargs):
+        raise RuntimeError("process died")
+
+    monkeypatch.setattr(PointsService, "distribute_commissions", crash)
+    with pytest.raises(RuntimeError):
+        await FilePurchaseService.flush()
+    monkeypatch.undo()
+
+    # пачка під живим lease не береться повторно
+    assert await FilePurchaseService.flush() == 0
+    await expire_leases()
+    assert await FilePurchaseService.flush() == 2
+
+    await assert_applied_once(sales, author)
+
+
+async def test_flush_that_crashed_before_settling_is_not_applied_twice(sales, author):
+    # усі інкременти й винагороди записано, але до settled=True процес не дійшов
+    token, txs = await FilePurchaseService._claim(100)
+    await File.get_motor_collection().bulk_write([idempotent_inc(sales.id, {"purchase_count": len(txs)}, token)])
+    await PointsService.distribute_commissions(
+        [(tx.id, tx.author_id, tx.file_id, tx.commission) for tx in txs], token,
+    )
+
+    await expire_leases()
+    assert await FilePurchaseService.flush() == 2
+
+    await assert_applied_once(sales, author)
+
+
+async def test_idempotent_inc_keeps_a_bounded_token_history(author):
+    coll = User.get_motor_collection()
+    token = ObjectId()
+    await coll.bulk_write([idempotent_inc(author.id, {"points": 5}, token)])
+    await coll.bulk_write([idempotent_inc(author.id, {"points": 5}, token)])
+    assert (await User.get(author.id)).points == 5
+
+    for _ in range(APPLIED_TOKENS_KEPT + 10):
+        await coll.bulk_write([idempotent_inc(author.id, {"points": 1}, ObjectId())])
+    raw = await coll.find_one({"_id": author.id})
+    assert len(raw["applied_tokens"]) == APPLIED_TOKENS_KEPT
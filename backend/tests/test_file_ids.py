@@ -0,0 +1,16 @@
+import pytest
+from fastapi import HTTPException
+
+from app.services.files import FileService
+from app.services.thumbs import ThumbService
+
+
+@pytest.mark.parametrize("bad", ["", "42", "z" * 24, "not-an-id"])
+async def test_malformed_file_id_is_404(bad):
+    with pytest.raises(HTTPException) as e:
+        await FileService.get_file_doc(bad)
+    assert e.value.status_code == 404
+
+    with pytest.raises(HTTPException) as e:
+        await ThumbService.get_thumb(bad, 256, 0, "jpeg")
+    assert e.value.status_code == 404
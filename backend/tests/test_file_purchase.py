@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app.models.account import User
+from app.models.file_purchase import FilePurchaseTransaction
+from app.schemas.file_purchase import CartPurchaseRequest, PurchaseFileRequest
+from app.services.file_purchase import AlreadyPurchased, FilePurchaseService
+from app.services.points import PointsService
+
+
+async def points(user: User) -> int:
+    return (await User.get(user.id)).points
+
+
+async def test_purchase_debits_price_and_records_ledger_entry(make_buyer, make_file, author):
+    buyer, f = await make_buyer(100), await make_file(40)
+
+    await FilePurchaseService.purchase_file(str(buyer.id), str(f.id))
+
+    assert await points(buyer) == 60
+    tx = await FilePurchaseTransaction.find_one(FilePurchaseTransaction.user_id == buyer.id)
+    assert (tx.file_id, tx.points_spent, tx.author_id) == (f.id, 40, author.id)
+    assert tx.commission == PointsService.commission_for(40)
+    assert tx.settled is False
+
+
+async def test_purchase_without_enough_points_is_402_and_changes_nothing(make_buyer, make_file):
+    buyer, f = await make_buyer(39), await make_file(40)
+
+    with pytest.raises(HTTPException) as e:
+        await FilePurchaseService.purchase_file(str(buyer.id), str(f.id))
+
+    assert e.value.status_code == 402
+    assert await points(buyer) == 39
+    assert await FilePurchaseTransaction.count() == 0
+
+
+async def test_repeat_purchase_is_409_and_not_charged_twice(make_buyer, make_file):
+    buyer, f = await make_buyer(100), await make_file(40)
+    await FilePurchaseService.purchase_file(str(buyer.id), str(f.id))
+
+    with pytest.raises(AlreadyPurchased):
+        await FilePurchaseService.purchase_file(str(buyer.id), str(f.id))
+
+    assert await points(buyer) == 60
+    assert await FilePurchaseTransaction.count() == 1
+
+
+async def test_concurrent_purchases_of_one_file_charge_once(make_buyer, make_file):
+    buyer, f = await make_buyer(100), await make_file(40)
+
+    results = await asyncio.gather(
+        *(FilePurchaseService.purchase_file(str(buyer.id), str(f.id)) for _ in range(5)),
+        return_exceptions=True,
+    )
+
+    assert sum(r is None for r in results) == 1
+    assert all(isinstance(r, AlreadyPurchased) for r in results if r is not None)
+    # без транзакцій списання програвших повертається компенсацією
+    assert await points(buyer) == 60
+    assert await FilePurchaseTransaction.count() == 1
+
+
+async def test_cart_skips_owned_files_and_charges_only_new_ones(make_buyer, make_file):
+    buyer = await make_buyer(100)
+    owned, new = await make_file(40), await make_file(50)
+    await FilePurchaseService.purchase_file(str(buyer.id), str(owned.id))
+
+    result = await FilePurchaseService.purchase_cart(str(buyer.id), [str(owned.id), str(new.id), str(new.id)])
+
+    assert result.purchased == [str(new.id)]
+    assert result.skipped == [str(owned.id)]
+    assert result.points_spent == 50
+    assert await points(buyer) == 10
+    assert await FilePurchaseTransaction.count() == 2
+
+
+async def test_cart_is_all_or_nothing_when_points_run_out(make_buyer, make_file):
+    buyer = await make_buyer(80)
+    a, b = await make_file(40), await make_file(50)
+
+    with pytest.raises(HTTPException) as e:
+        await FilePurchaseService.purchase_cart(str(buyer.id), [str(a.id), str(b.id)])
+
+    assert e.value.status_code == 402
+    assert await points(buyer) == 80
+    assert await FilePurchaseTransaction.count() == 0
+
+
+async def test_cart_with_unknown_file_is_404(make_buyer, make_file):
+    buyer, f = await make_buyer(100), await make_file(40)
+
+    with pytest.raises(HTTPException) as e:
+        await FilePurchaseService.purchase_cart(str(buyer.id), [str(f.id), "0" * 24])
+
+    assert e.value.status_code == 404
+    assert await points(buyer) == 100
+
+
+@pytest.mark.parametrize("bad", ["", "42", "z" * 24, "0" * 25])
+def test_malformed_file_ids_are_rejected_by_request_schemas(bad):
+    with pytest.raises(ValidationError):
+        PurchaseFileRequest(file_id=bad)
+    with pytest.raises(ValidationError):
+        CartPurchaseRequest(file_ids=["0" * 24, bad])
@@ -0,0 +1,43 @@
+from app.core import loaders
+from app.core.loaders import DataLoader
+from app.core.ownership import owned_files
+from app.models.account import User
+from app.models.files import File
+from app.services import files
+from app.services.files import FileService
+
+
+async def test_catalog_page_loads_authors_and_purchases_in_one_batch_each(monkeypatch, make_buyer):
+    authors = [User(username=f"a{i}", email=f"a{i}@example.com", password="x") for i in range(20)]
+    await User.insert_many(authors)
+    await File.insert_many([
+        File(author_id=a.id, file_key=f"k{i}", file_type="image/png", title="f", price=10)
+        for i, a in enumerate(authors)
+    ])
+    buyer = await make_buyer(0)
+
+    user_batches, purchase_batches = [], []
+    batch_users, owned_get = loaders._batch_users, owned_files.get
+
+    async def count_users(ids):
+        user_batches.append(len(ids))
+        return await batch_users(ids)
+
+    async def count_purchases(uid):
+        purchase_batches.append(uid)
+        return await owned_get(uid)
+
+    async def sign(key, *args, **kwargs):
+        return key
+
+    monkeypatch.setattr(loaders, "_batch_users", count_users)
+    monkeypatch.setattr(owned_files, "get", count_purchases)
+    monkeypatch.setattr(files, "create_signed_url", sign)
+
+    items, _ = await FileService.list_files(str(buyer.id), limit=20)
+
+    assert len(items) == 20
+    assert {item.author_username for item in items} == {a.username for a in authors}
+    assert user_batches == [20]
+    assert len(purchase_batches) == 1
+    assert not DataLoader._dispatching
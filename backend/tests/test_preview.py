@@ -0,0 +1,45 @@
+from io import BytesIO
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.services import preview
+from app.services.preview import WAVEFORM_PEAKS, PreviewService
+
+
+def wav(frames: int, channels: int = 2, sr: int = 8000) -> bytes:
+    rng = np.random.default_rng(frames)
+    buf = BytesIO()
+    sf.write(buf, rng.uniform(-1, 1, (frames, channels)).astype(np.float32), sr, format="WAV", subtype="FLOAT")
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("block", [65536, 1000, 300])
+@pytest.mark.parametrize("frames", [5000, 300_001, 1_048_576])
+def test_streamed_peaks_match_whole_track_envelope(monkeypatch, frames, block):
+    # block < spp — одна пара розтягується на кілька блоків
+    monkeypatch.setattr(preview, "WAVEFORM_BLOCK_FRAMES", block)
+    data = wav(frames)
+
+    peaks, sr, spp = PreviewService._waveform_peaks(data)
+
+    y = sf.read(BytesIO(data), dtype="float32", always_2d=True)[0].mean(axis=1)
+    lo, hi = PreviewService._envelope(y, spp)
+    assert sr == 8000
+    assert len(peaks) == -(-frames // spp) <= WAVEFORM_PEAKS
+    np.testing.assert_array_equal(peaks[:, 0], lo)
+    np.testing.assert_array_equal(peaks[:, 1], hi)
+
+
+def test_long_track_yields_full_peak_count():
+    peaks, _, _ = PreviewService._waveform_peaks(wav(2_000_000, channels=1))
+
+    assert peaks.shape == (WAVEFORM_PEAKS, 2)
+
+
+def test_variants_do_not_share_default_dicts():
+    a, b = preview.Variants(None, b"a"), preview.Variants(None, b"b")
+    a.meta["phash"] = "0" * 16
+    a.renditions["128w.jpg"] = (b"", "image/jpeg")
+
+    assert b.meta == {} and b.renditions == {}
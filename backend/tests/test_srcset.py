@@ -0,0 +1,37 @@
+import pytest
+
+from app.services import files
+from app.services.files import FileService
+
+LADDER = {f"{w}w.{ext}": f"{w}.{ext}" for w in (128, 256, 512, 1024) for ext in ("avif", "webp", "jpg")}
+
+
+@pytest.fixture(autouse=True)
+def signed(monkeypatch):
+    calls = []
+
+    async def sign(key, *args, **kwargs):
+        calls.append(key)
+        return f"https://s3/{key}"
+
+    monkeypatch.setattr(files, "create_signed_url", sign)
+    return calls
+
+
+@pytest.mark.parametrize("accept, mime", [
+    ("", "image/jpeg"),
+    ("application/json, text/plain, */*", "image/jpeg"),
+    ("image/webp,*/*", "image/webp"),
+    ("image/avif,image/webp,*/*", "image/avif"),
+])
+async def test_srcset_signs_a_single_format(signed, accept, mime):
+    srcset = await FileService._build_srcset(LADDER, accept)
+
+    assert list(srcset) == [mime]
+    assert len(signed) == 4
+    assert srcset[mime].endswith("1024w")
+
+
+async def test_srcset_without_variants_is_empty(signed):
+    assert await FileService._build_srcset({}, "image/avif") == {}
+    assert signed == []
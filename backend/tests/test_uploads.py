@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+import pytest
+from bson import ObjectId
+
+from app.models.uploads import UploadSession
+from app.schemas.files import FileUploadRequest, UploadCreateRequest
+from app.services import uploads
+from app.services.uploads import OffsetMismatch, UploadService
+
+CHUNK = 4
+
+
+class FakeS3:
+    """Multipart upload у пам'яті; `gate` дозволяє притримати upload_part."""
+
+    def __init__(self):
+        self.parts: dict[str, dict[int, bytes]] = {}
+        self.objects: dict[str, bytes] = {}
+        self.aborted: list[str] = []
+        self.completed = 0
+        self.part_calls = 0
+        self.gate: asyncio.Event | None = None
+
+    async def create_multipart_upload(self, key, content_type):
+        upload_id = f"mpu-{key}"
+        self.parts[upload_id] = {}
+        return upload_id
+
+    async def upload_part(self, key, upload_id, part_number, data):
+        self.part_calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        self.parts[upload_id][part_number] = data
+        return {"ETag": f"etag-{part_number}", "PartNumber": part_number}
+
+    async def complete_multipart_upload(self, key, upload_id, parts):
+        self.completed += 1
+        self.objects[key] = b"".join(self.parts[upload_id][p["PartNumber"]] for p in parts)
+
+    async def abort_multipart_upload(self, key, upload_id):
+        self.aborted.append(upload_id)
+
+    async def iter_object(self, key):
+        yield self.objects[key]
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    for name in ("create_multipart_upload", "upload_part", "complete_multipart_upload",
+                 "abort_multipart_upload", "iter_object"):
+        monkeypatch.setattr(uploads, name, getattr(fake, name))
+    monkeypatch.setattr(uploads, "MULTIPART_CHUNK_SIZE", CHUNK)
+
+    async def admit(file_type, size):
+        return 0.0
+
+    monkeypatch.setattr(uploads.admission, "check", admit)
+    return fake
+
+
+class Registry(list):
+    """Виклики FileService.register; `fail` — скільки наступних викликів упаде."""
+    fail = 0
+
+    async def register(self, author_id, meta, key, sha256, size, content_type):
+        self.append((key, sha256, size))
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("mongo went away")
+        return str(ObjectId())
+
+
+@pytest.fixture
+def registered(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr(uploads.FileService, "register", registry.register)
+    return registry
+
+
+@pytest.fixture
+def discarded(monkeypatch):
+    keys = []
+
+    async def discard(key):
+        keys.append(key)
+
+    monkeypatch.setattr(uploads.BlobService, "discard", discard)
+    return keys
+
+
+async def body(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def new_session(size: int) -> UploadSession:
+    req = UploadCreateRequest(meta=FileUploadRequest(title="f", file_type="application/zip"), size=size)
+    return await UploadService.create(str(ObjectId()), req)
+
+
+async def reload(session: UploadSession) -> UploadSession:
+    return await UploadSession.get(session.id)
+
+
+async def test_wrong_offset_is_409_with_the_current_offset(s3):
+    session = await new_session(10)
+    await UploadService.append(session, 0, body(b"abcd"))
+
+    with pytest.raises(OffsetMismatch) as e:
+        await UploadService.append(await reload(session), 0, body(b"abcd"))
+
+    assert e.value.status_code == 409
+    assert e.value.headers == {"Upload-Offset": "4"}
+    assert (await reload(session)).offset == 4
+
+
+async def test_short_tail_before_the_end_is_dropped(s3):
+    session = await new_session(10)
+
+    await UploadService.append(session, 0, body(b"abcdef"))
+
+    # неповний part не зберігається: клієнт продовжить з 4
+    assert (await reload(session)).offset == 4
+    assert s3.part_calls == 1
+
+
+async def test_concurrent_patches_at_the_same_offset_write_one_part(s3):
+    session = await new_session(10)
+    first, second = await reload(session), await reload(session)
+    s3.gate = asyncio.Event()
+
+    winner = asyncio.ensure_future(UploadService.append(first, 0, body(b"aaaa")))
+    await asyncio.sleep(0.01)
+    # програвший отримує 409 одразу, не чекаючи на S3
+    with pytest.raises(OffsetMismatch):
+        await asyncio.wait_for(UploadService.append(second, 0, body(b"bbbb")), 1)
+    s3.gate.set()
+    await winner
+
+    stored = await reload(session)
+    assert stored.offset == 4
+    assert stored.writer is None
+    assert s3.part_calls == 1
+    assert s3.parts[stored.s3_upload_id] == {1: b"aaaa"}
+
+
+async def test_completed_upload_registers_the_file_once(s3, registered):
+    data = b"0123456789"
+    session = await new_session(len(data))
+
+    done = await UploadService.append(session, 0, body(data[:3], data[3:]))
+
+    assert done.status == "done" and done.file_id is not None
+    assert s3.objects[done.key] == data
+    assert registered == [(done.key, hashlib.sha256(data).hexdigest(), len(data))]
+
+    # відповідь загубилась — повторний PATCH отримує той самий file_id
+    retry = await UploadService.append(await reload(session), 0, body(data))
+    assert retry.file_id == done.file_id
+    assert len(registered) == 1
+
+
+async def test_interrupted_finalization_is_resumed_by_the_next_patch(s3, registered):
+    data = b"0123456789"
+    session = await new_session(len(data))
+    registered.fail = 1
+
+    with pytest.raises(RuntimeError):
+        await UploadService.append(session, 0, body(data))
+
+    stuck = await reload(session)
+    assert stuck.status == "completing"
+    assert stuck.assembled and stuck.sha256 == hashlib.sha256(data).hexdigest()
+    assert stuck.locked_until is None
+
+    retry = await UploadService.append(stuck, len(data), body())
+
+    assert retry.status == "done" and retry.file_id is not None
+    assert (await reload(session)).file_id == retry.file_id
+    # part-и зібрано один раз, повтор почав з реєстрації
+    assert s3.completed == 1
+    assert len(registered) == 2
+
+
+async def test_finalization_under_a_live_lease_is_not_repeated(s3, registered):
+    session = await new_session(4)
+    await UploadSession.get_motor_collection().update_one({"_id": session.id}, {"$set": {
+        "offset": 4, "status": "completing",
+        "locked_until": datetime.now(timezone.utc) + timedelta(seconds=60),
+    }})
+
+    result = await UploadService.append(await reload(session), 4, body())
+
+    assert result.status == "completing"
+    assert registered == [] and s3.completed == 0
+
+
+async def test_sweeper_aborts_expired_sessions_only(s3, discarded):
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    active, assembled, done, fresh = [await new_session(10) for _ in range(4)]
+    coll = UploadSession.get_motor_collection()
+    await coll.update_one({"_id": active.id}, {"$set": {"expires_at": past}})
+    await coll.update_one({"_id": assembled.id}, {"$set": {"expires_at": past, "status": "completing", "assembled": True}})
+    await coll.update_one({"_id": done.id}, {"$set": {"expires_at": past, "status": "done", "assembled": True}})
+
+    assert await UploadService.expire_abandoned() == 3
+
+    assert s3.aborted == [active.s3_upload_id]
+    assert discarded == [assembled.key]
+    assert [s.id for s in await UploadSession.find_all().to_list()] == [fresh.id]
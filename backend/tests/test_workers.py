@@ -0,0 +1,45 @@
+import asyncio
+import operator
+import threading
+import time
+import pytest
+
+from app.core.workers import PreviewTimeout, ProcessPool
+
+
+@pytest.fixture
+async def pool():
+    pool = ProcessPool(workers=2, timeout=30, max_jobs_per_worker=2)
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+
+async def test_timeout_kills_only_the_stuck_job(pool):
+    stuck = pool.run(time.sleep, 30, timeout=1.0)
+    busy = pool.run(time.sleep, 1.5)
+
+    results = await asyncio.gather(stuck, busy, return_exceptions=True)
+
+    assert isinstance(results[0], PreviewTimeout)
+    assert isinstance(results[0], TimeoutError)
+    assert results[1] is None
+    # воркер на місці вбитого знову приймає задачі
+    assert await asyncio.gather(*(pool.run(operator.add, i, 1) for i in range(4))) == [1, 2, 3, 4]
+
+
+async def test_waiting_for_a_result_does_not_hold_a_thread(pool):
+    threads = threading.active_count()
+    job = asyncio.ensure_future(pool.run(time.sleep, 2))
+    await asyncio.sleep(0.5)
+
+    assert threading.active_count() == threads
+    await job
+
+
+async def test_job_errors_are_raised_in_the_caller(pool):
+    with pytest.raises(ZeroDivisionError):
+        await pool.run(operator.truediv, 1, 0)
+    # recycling after max_jobs_per_worker keeps the pool usable
+    for _ in range(5):
+        assert await pool.run(operator.mul, 6, 7) == 42
@@ -9,8 +9,11 @@ export type File = {
   purchase_count: number
   upload_date: string
   thumbnail_url: string
+  thumbnail_srcset: Record<string, string>
   preview_url: string
+  waveform_url?: string
   file_url: string
+  variants_status: 'pending' | 'ready' | 'failed'
   viewer_status: string
 }
 
@@ -0,0 +1,28 @@
+export type Waveform = {
+  sampleRate: number
+  samplesPerPeak: number
+  // (min, max) пари в діапазоні -128..127, peaks[2 * i] — min, peaks[2 * i + 1] — max
+  peaks: Int8Array
+}
+
+const HEADER_SIZE = 20
+
+// Розбирає файл з `waveform_url`: "O4LW", версія (u8), 3 байти padding, sampleRate, samplesPerPeak, count (u32 LE)
+export function parseWaveform(buffer: ArrayBuffer): Waveform {
+  const view = new DataView(buffer)
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4))
+  if (magic !== 'O4LW' || view.getUint8(4) !== 1) {
+    throw new Error('Unsupported waveform format')
+  }
+  const count = view.getUint32(16, true)
+  return {
+    sampleRate: view.getUint32(8, true),
+    samplesPerPeak: view.getUint32(12, true),
+    peaks: new Int8Array(buffer, HEADER_SIZE, count * 2),
+  }
+}
+
+// Секунда треку, що відповідає парі peaks з індексом i (для scrubbing)
+export function peakTime(waveform: Waveform, i: number): number {
+  return (i * waveform.samplesPerPeak) / waveform.sampleRate
+}